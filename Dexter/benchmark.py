@@ -0,0 +1,320 @@
+"""
+Offline throughput benchmark for the chat front ends and textbook retrieval.
+
+Runs N concurrent simulated students against a local `MockOpenAIServer`
+(or any OpenAI-compatible `--base-url`) and reports latency percentiles,
+time to first token, turns/sec and memory per session for each path:
+
+    console    - `ChatAgent.get_response` (mathBotLib console loop)
+    gradio     - the Gradio ChatInterface callback, frame by frame
+    streamlit  - `ChatEngine.stream_response` on threads, as the pages do
+    retrieval  - `query_textbook` alone
+
+Example:
+    python benchmark.py --students 20 --turns 3 --tokens-per-second 40 --json results.json
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import argparse
+import asyncio
+import json
+import math
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from mock_openai import MockOpenAIServer
+
+
+PATHS = ('console', 'gradio', 'streamlit', 'retrieval')
+
+QUESTIONS = [
+    "What is a function?",
+    "How do I find the domain of f(x) = 1/(x - 2)?",
+    "What does the vertical line test tell me?",
+    "Evaluate f(3) for f(x) = x^2 - 4x + 1.",
+    "What is the difference between the domain and the range?",
+    "How do I compose two functions?",
+    "Is x^2 + y^2 = 1 a function of x?",
+    "What is an inverse function?",
+]
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile (0.0 for no values)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def _questions(student: int, turns: int) -> list[str]:
+    return [QUESTIONS[(student + turn) % len(QUESTIONS)] for turn in range(turns)]
+
+
+def _summarize(path: str, sessions: int, seconds: float, latencies: list, ttfts: list, memory: int | None) -> dict:
+    return {
+        'path': path,
+        'sessions': sessions,
+        'turns': len(latencies),
+        'seconds': seconds,
+        'turns_per_sec': len(latencies) / seconds if seconds else 0.0,
+        'latency_p50': percentile(latencies, 50),
+        'latency_p95': percentile(latencies, 95),
+        'latency_p99': percentile(latencies, 99),
+        'ttft_p50': percentile(ttfts, 50) if ttfts else None,
+        'ttft_p95': percentile(ttfts, 95) if ttfts else None,
+        'ttft_p99': percentile(ttfts, 99) if ttfts else None,
+        'memory_per_session_kib': memory / sessions / 1024 if memory is not None else None,
+    }
+
+
+class _Run:
+    """Wall clock plus optional tracemalloc accounting for one benchmark path."""
+
+    def __init__(self, trace_memory: bool):
+        self.trace_memory = trace_memory
+        self.latencies = []
+        self.ttfts = []
+
+    def __enter__(self):
+        if self.trace_memory:
+            tracemalloc.start()
+        self._baseline = tracemalloc.get_traced_memory()[0] if self.trace_memory else 0
+        self._start = time.perf_counter()
+        return self
+
+    def measure_memory(self):
+        # Called while the sessions are still alive
+        self.memory = tracemalloc.get_traced_memory()[0] - self._baseline if self.trace_memory else None
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.seconds = time.perf_counter() - self._start
+        if self.trace_memory:
+            tracemalloc.stop()
+
+    def record(self, start: float, first_token: float | None):
+        end = time.perf_counter()
+        self.latencies.append(end - start)
+        if first_token is not None:
+            self.ttfts.append(first_token - start)
+
+
+async def _console_student(run: _Run, agent, questions: list[str]):
+    for question in questions:
+        start = time.perf_counter()
+        first_token = None
+        async for kind, _ in agent.get_response(question):
+            if kind == 'output' and first_token is None:
+                first_token = time.perf_counter()
+        run.record(start, first_token)
+
+
+async def _gradio_student(run: _Run, agent, questions: list[str]):
+    from mathBotLib import _gradio_stream
+
+    chat_view_history = []
+    for question in questions:
+        start = time.perf_counter()
+        first_token = None
+        output = ''
+        async for output, _, _, agent in _gradio_stream(question, chat_view_history, agent):
+            if output and first_token is None:
+                first_token = time.perf_counter()
+        chat_view_history += [{'role': 'user', 'content': question}, {'role': 'assistant', 'content': output}]
+        run.record(start, first_token)
+
+
+def bench_async(path: str, students: int, turns: int, agent_args: dict, trace_memory: bool) -> dict:
+    """Drive `students` concurrent `ChatAgent`s through the console or Gradio path."""
+    from mathBotLib import ChatAgent
+
+    student = _console_student if path == 'console' else _gradio_student
+
+    with _Run(trace_memory) as run:
+        agents = [ChatAgent(**agent_args) for _ in range(students)]
+
+        async def run_all():
+            await asyncio.gather(*(
+                student(run, agent, _questions(i, turns)) for i, agent in enumerate(agents)
+            ))
+
+        asyncio.run(run_all())
+        run.measure_memory()
+    return _summarize(path, students, run.seconds, run.latencies, run.ttfts, run.memory)
+
+
+def bench_streamlit(students: int, turns: int, agent_args: dict, trace_memory: bool) -> dict:
+    """Drive `students` sync engines on threads, sharing one client like the pages."""
+    from chat_engine import ChatEngine
+
+    with _Run(trace_memory) as run:
+        engines = [ChatEngine(**agent_args) for _ in range(students)]
+
+        def student(engine, questions):
+            for question in questions:
+                start = time.perf_counter()
+                first_token = None
+                for kind, _ in engine.stream_response(question):
+                    if kind == 'output' and first_token is None:
+                        first_token = time.perf_counter()
+                run.record(start, first_token)
+
+        with ThreadPoolExecutor(max_workers=students) as pool:
+            for future in [pool.submit(student, engine, _questions(i, turns)) for i, engine in enumerate(engines)]:
+                future.result()
+        run.measure_memory()
+    return _summarize('streamlit', students, run.seconds, run.latencies, run.ttfts, run.memory)
+
+
+def bench_retrieval(students: int, turns: int, agent_args: dict, trace_memory: bool) -> dict:
+    """Concurrent `query_textbook` calls, one thread per student."""
+    from chroma_db import query_textbook
+
+    with _Run(trace_memory) as run:
+        def student(questions):
+            for question in questions:
+                start = time.perf_counter()
+                query_textbook(
+                    agent_args['collection_name'],
+                    question,
+                    top_k=agent_args['top_k'],
+                    persist_dir=agent_args['db_path']
+                )
+                run.record(start, None)
+
+        with ThreadPoolExecutor(max_workers=students) as pool:
+            for future in [pool.submit(student, _questions(i, turns)) for i in range(students)]:
+                future.result()
+        run.measure_memory()
+    return _summarize('retrieval', students, run.seconds, run.latencies, run.ttfts, run.memory)
+
+
+def print_report(results: list[dict]):
+    header = f"{'path':<10} {'turns':>6} {'turns/s':>8} {'p50':>7} {'p95':>7} {'p99':>7} {'ttft50':>7} {'ttft95':>7} {'KiB/sess':>9}"
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        ttft50, ttft95 = (f"{r[key]:.3f}" if r[key] is not None else '-' for key in ('ttft_p50', 'ttft_p95'))
+        memory = f"{r['memory_per_session_kib']:.1f}" if r['memory_per_session_kib'] is not None else '-'
+        print(
+            f"{r['path']:<10} {r['turns']:>6} {r['turns_per_sec']:>8.2f}"
+            f" {r['latency_p50']:>7.3f} {r['latency_p95']:>7.3f} {r['latency_p99']:>7.3f}"
+            f" {ttft50:>7} {ttft95:>7} {memory:>9}"
+        )
+
+
+def main(
+    paths: list[str],
+    students: int = 10,
+    turns: int = 3,
+    model: str = 'gpt-4.1-nano',
+    collection_name: str = 'chapter-1-functions',
+    db_path: str | None = None,
+    base_url: str | None = None,
+    tokens_per_second: float = 50.0,
+    first_token_delay: float = 0.3,
+    embedding_cache: bool = False,
+    query_cache: bool = False,
+    trace_memory: bool = True
+) -> list[dict]:
+    from chat_engine import DEFAULT_DB_PATH, load_prompt
+    from chroma_db import get_single_flight
+
+    # Work on a copy so the benchmark never writes to the committed database
+    scratch = tempfile.mkdtemp(prefix='mathbot-bench-')
+    bench_db = os.path.join(scratch, 'chroma_db')
+    shutil.copytree(db_path or DEFAULT_DB_PATH, bench_db)
+
+    if not embedding_cache:
+        os.environ['EMBEDDING_CACHE_PATH'] = 'off'
+    if not query_cache:
+        # Concurrent duplicates are still coalesced; only the result cache is off.
+        # chroma_db is already imported here, so QUERY_CACHE_TTL would be too late.
+        flights = get_single_flight()
+        flights.ttl = 0
+        flights.clear()
+
+    server = None
+    if base_url is None:
+        server = MockOpenAIServer(tokens_per_second=tokens_per_second, first_token_delay=first_token_delay).start()
+        base_url = server.base_url
+    os.environ['OPENAI_BASE_URL'] = base_url
+    os.environ.setdefault('OPENAI_API_KEY', 'mock')
+
+    agent_args = dict(
+        model=model,
+        prompt=load_prompt(Path(__file__).parent / 'Teacher_prompt.md'),
+        collection_name=collection_name,
+        db_path=bench_db,
+        top_k=3
+    )
+
+    print(f"Benchmarking {students} students x {turns} turns against {base_url}")
+    results = []
+    try:
+        # One untimed turn warms up imports, the collection, the tokenizer and the clients
+        bench_async('console', 1, 1, agent_args, trace_memory=False)
+
+        for path in paths:
+            if path in ('console', 'gradio'):
+                result = bench_async(path, students, turns, agent_args, trace_memory)
+            elif path == 'streamlit':
+                result = bench_streamlit(students, turns, agent_args, trace_memory)
+            else:
+                result = bench_retrieval(students, turns, agent_args, trace_memory)
+            results.append(result)
+            print(f"  {path}: {result['turns']} turns in {result['seconds']:.2f}s")
+    finally:
+        if server is not None:
+            server.stop()
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    print()
+    print_report(results)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser('benchmark')
+    parser.add_argument('--paths', default=','.join(PATHS), help=f"Comma-separated subset of {', '.join(PATHS)}")
+    parser.add_argument('--students', type=int, default=10, help='Concurrent simulated students')
+    parser.add_argument('--turns', type=int, default=3, help='Questions per student')
+    parser.add_argument('--model', default='gpt-4.1-nano')
+    parser.add_argument('--collection', default='chapter-1-functions')
+    parser.add_argument('--db-path', default=None, help='Chroma database to copy (default: chroma_db_persistent)')
+    parser.add_argument('--base-url', default=None, help='Use this API instead of starting the mock server')
+    parser.add_argument('--tokens-per-second', type=float, default=50.0, help='Mock server token rate')
+    parser.add_argument('--first-token-delay', type=float, default=0.3, help='Mock server delay before the first token')
+    parser.add_argument('--embedding-cache', action='store_true', help='Keep the on-disk embedding cache enabled')
+    parser.add_argument('--query-cache', action='store_true', help='Keep the short-lived retrieval result cache enabled')
+    parser.add_argument('--no-memory', action='store_true', help='Skip tracemalloc (lower overhead, no memory column)')
+    parser.add_argument('--json', type=Path, default=None, help='Also write the results to this JSON file')
+    args = parser.parse_args()
+
+    paths = [path.strip() for path in args.paths.split(',') if path.strip()]
+    unknown = set(paths) - set(PATHS)
+    if unknown:
+        parser.error(f"Unknown paths: {', '.join(sorted(unknown))}")
+
+    results = main(
+        paths,
+        students=args.students,
+        turns=args.turns,
+        model=args.model,
+        collection_name=args.collection,
+        db_path=args.db_path,
+        base_url=args.base_url,
+        tokens_per_second=args.tokens_per_second,
+        first_token_delay=args.first_token_delay,
+        embedding_cache=args.embedding_cache,
+        query_cache=args.query_cache,
+        trace_memory=not args.no_memory
+    )
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
@@ -0,0 +1,204 @@
+"""
+In-process BM25 index for lexical retrieval alongside a Chroma collection.
+
+Math questions often hinge on exact tokens ("f(x) = 2x + 3", "vertical line
+test", "domain") that embeddings blur together. Each collection gets an
+inverted index stored next to the Chroma directory
+(`<persist_dir>_bm25/<collection>.json`). `chroma_db` fuses its ranking with
+the vector ranking by reciprocal rank fusion and can rerank the fused
+candidates by exact term and phrase overlap.
+"""
+
+from __future__ import annotations
+
+from collections import Counter
+from pathlib import Path
+from typing import Iterable, Optional
+import heapq
+import math
+import re
+import threading
+
+from sidecar import FileCache, read_json, sidecar_path, write_json
+
+
+# Function applications like f(x), numbers with an optional variable (2x, 3.5),
+# words, and single operators
+_TOKEN_PATTERN = re.compile(r"[a-z]\([a-z0-9]+\)|\d+(?:\.\d+)?[a-z]*|[a-z]+|[=+\-*/^<>≤≥]")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i if in is it me of on or so that "
+    "the this to what when which why with you".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    """Lower-cased, math-aware tokens without stopwords."""
+    return [token for token in _TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """Okapi BM25 over an inverted index, with an optional chapter filter."""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._docs = {}      # id -> (term frequencies, length, chapter)
+        self._postings = {}  # term -> {id: term frequency}
+        self._total_length = 0
+
+    def __len__(self):
+        return len(self._docs)
+
+    def __contains__(self, doc_id: str):
+        return doc_id in self._docs
+
+    def add(self, doc_id: str, text: str, metadata: Optional[dict] = None):
+        """Index (or re-index) one document."""
+        frequencies = Counter(tokenize(text))
+        self._insert(doc_id, dict(frequencies), sum(frequencies.values()), (metadata or {}).get('chapter'))
+
+    def _insert(self, doc_id: str, frequencies: dict, length: int, chapter: Optional[str]):
+        with self._lock:
+            if doc_id in self._docs:
+                self.remove(doc_id)
+            self._docs[doc_id] = (frequencies, length, chapter)
+            self._total_length += length
+            for term, count in frequencies.items():
+                self._postings.setdefault(term, {})[doc_id] = count
+
+    def remove(self, doc_id: str):
+        with self._lock:
+            entry = self._docs.pop(doc_id, None)
+            if entry is None:
+                return
+            frequencies, length, _ = entry
+            self._total_length -= length
+            for term in frequencies:
+                postings = self._postings[term]
+                del postings[doc_id]
+                if not postings:
+                    del self._postings[term]
+
+    def search(self, query: str, top_k: int = 10, chapter: Optional[str] = None) -> list[tuple[str, float]]:
+        """Return up to `top_k` (id, score) pairs, best first."""
+        with self._lock:
+            if not self._docs:
+                return []
+            count = len(self._docs)
+            average_length = self._total_length / count or 1.0
+            scores = {}
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, frequency in postings.items():
+                    _, length, doc_chapter = self._docs[doc_id]
+                    if chapter and doc_chapter != chapter:
+                        continue
+                    norm = self.k1 * (1 - self.b + self.b * length / average_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+            return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                'k1': self.k1,
+                'b': self.b,
+                'docs': {doc_id: [freqs, length, chapter] for doc_id, (freqs, length, chapter) in self._docs.items()},
+            }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'BM25Index':
+        index = cls(data['k1'], data['b'])
+        for doc_id, (frequencies, length, chapter) in data['docs'].items():
+            index._insert(doc_id, frequencies, length, chapter)
+        return index
+
+
+def reciprocal_rank_fusion(rankings: list[list[str]], k: int = 60) -> list[tuple[str, float]]:
+    """Fuse ranked id lists: score(d) = sum over lists of 1 / (k + rank)."""
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def rerank_by_overlap(query: str, candidates: list[tuple[str, str, float]], weight: float = 1.0) -> list[tuple[str, float]]:
+    """Rerank (id, text, score) candidates by exact query term and phrase coverage.
+
+    A cheap stand-in for a cross-encoder: passages that contain the
+    question's terms and adjacent term pairs (e.g. "vertical line") move up.
+    """
+    terms = tokenize(query)
+    query_terms = set(terms)
+    query_pairs = set(zip(terms, terms[1:]))
+    reranked = []
+    for doc_id, text, score in candidates:
+        tokens = tokenize(text)
+        coverage = len(query_terms & set(tokens)) / len(query_terms) if query_terms else 0.0
+        phrases = len(query_pairs & set(zip(tokens, tokens[1:]))) / len(query_pairs) if query_pairs else 0.0
+        reranked.append((doc_id, score * (1.0 + weight * (coverage + phrases))))
+    return sorted(reranked, key=lambda item: item[1], reverse=True)
+
+
+def index_path(persist_dir: str, collection_name: str) -> Path:
+    """Location of a collection's BM25 index (see `sidecar`)."""
+    return sidecar_path(persist_dir, "bm25", f"{collection_name}.json")
+
+
+def build_index(collection) -> BM25Index:
+    """Index every document currently in a Chroma collection."""
+    index = BM25Index()
+    data = collection.get(include=['documents', 'metadatas'])
+    for doc_id, document, metadata in zip(data['ids'], data['documents'], data['metadatas']):
+        index.add(doc_id, document or '', metadata)
+    return index
+
+
+_indexes = FileCache()  # (persist_dir, collection) -> index
+
+
+def get_index(persist_dir: Optional[str], collection) -> BM25Index:
+    """Return the process-wide index for `collection`.
+
+    Loaded from disk (and reloaded when the file changes), or built from the
+    collection's documents when no index file exists yet.
+    """
+    return _indexes.get(
+        (persist_dir, collection.name),
+        index_path(persist_dir, collection.name) if persist_dir else None,
+        load=lambda path: BM25Index.from_dict(read_json(path)),
+        missing=lambda: build_index(collection)
+    )
+
+
+def save_index(persist_dir: Optional[str], collection_name: str, index: BM25Index):
+    """Write `index` to disk (no-op for in-memory databases)."""
+    if not persist_dir:
+        return
+    mtime = write_json(index_path(persist_dir, collection_name), index.to_dict())
+    _indexes.set((persist_dir, collection_name), index, mtime)
+
+
+def update_index(
+    persist_dir: Optional[str],
+    collection,
+    add: Iterable[tuple[str, str, dict]] = (),
+    remove: Iterable[str] = ()
+):
+    """Apply added (id, document, metadata) records and removed ids, then save."""
+    index = get_index(persist_dir, collection)
+    for doc_id in remove:
+        index.remove(doc_id)
+    for doc_id, document, metadata in add:
+        index.add(doc_id, document, metadata)
+    save_index(persist_dir, collection.name, index)
+
+
+def clear():
+    """Forget loaded indexes (e.g. after a collection was rebuilt)."""
+    _indexes.clear()
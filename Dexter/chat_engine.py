@@ -0,0 +1,393 @@
+"""
+Chat engine shared by the console/Gradio bot (`mathBotLib`) and the
+Streamlit pages.
+
+One `ChatEngine` covers prompt loading, history management, textbook
+retrieval, streaming (async for Gradio/console, sync for Streamlit) and usage
+accounting, so every front end gets the same caching, pooling and history
+trimming. Front ends are configured per persona via `PERSONAS`.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Optional
+import re
+
+from openai import AsyncOpenAI, OpenAI
+
+from chroma_db import aquery_textbook, query_textbook
+from hashing import text_hash
+from history import ConversationHistory
+from metrics import RETRIEVAL_TIME, TurnTimer
+from openai_clients import get_async_client, get_client
+from prompts import LoadedPrompt, get_prompt
+from response_cache import SemanticResponseCache
+from tokens import count_tokens, truncate_to_tokens
+from usage import UsageTracker, format_usage_markdown
+
+
+DEXTER_DIR = Path(__file__).parent
+
+# Engine settings per front end. `prompt_file` is relative to this directory.
+PERSONAS = {
+    'teacher': dict(
+        prompt_file='Teacher_prompt.md',
+        model='gpt-3.5-turbo',
+        session_key='tutor_messages',
+    ),
+    'student': dict(
+        prompt_file='Student.md',
+        model='gpt-4.1-nano',
+        session_key='student_messages',
+    ),
+    'quiz': dict(
+        prompt_file='quiz_maker_prompt.md',
+        model='gpt-4.1-nano',
+        session_key='quiz_messages',
+    ),
+}
+
+DEFAULT_COLLECTION = 'chapter-1-functions'
+DEFAULT_DB_PATH = str(DEXTER_DIR / 'chroma_db_persistent')
+
+# Token budget for retrieved textbook context per turn
+DEFAULT_CONTEXT_TOKENS = 1500
+SEPARATOR = "-" * 50
+
+
+def load_prompt(prompt_path) -> LoadedPrompt | str:
+    """Return a system prompt via the prompt registry ('' when no path is given).
+
+    Pass the result straight to `ChatEngine` so it reuses the registry's hash
+    and token count.
+    """
+    if not prompt_path:
+        return ''
+    return get_prompt(prompt_path)
+
+
+def _header(metadata: dict) -> str:
+    return f"[{metadata.get('section', 'Unknown')} - {metadata.get('subsection', 'Unknown')}]"
+
+
+def pack_passages(hits: list, token_budget: int, model: str = 'gpt-5-nano') -> list:
+    """Keep the best (id, document, metadata) hits that fit in `token_budget`.
+
+    Hits are taken in rank order and skipped when they would overflow, so a
+    smaller lower-ranked passage can still fill the remaining space. Costs use
+    the `token_count` precomputed at index time when present. If no hit fits
+    at all (e.g. only unchunked subsections), the head of the top one is kept.
+    """
+    overhead = count_tokens(f"{SEPARATOR}\n", model)
+    packed = []
+    used = count_tokens(f"Relevant textbook content:\n{SEPARATOR}\n", model)
+    for doc_id, doc, metadata in hits:
+        framing = count_tokens(_header(metadata), model) + overhead + 1
+        cost = (metadata.get('token_count') or count_tokens(doc, model)) + framing
+        if used + cost <= token_budget:
+            packed.append((doc_id, doc, metadata))
+            used += cost
+
+    if not packed and hits:
+        doc_id, doc, metadata = hits[0]
+        framing = count_tokens(_header(metadata), model) + overhead + 1
+        packed.append((doc_id, truncate_to_tokens(doc, token_budget - used - framing, model), metadata))
+    return packed
+
+
+def format_context(
+    results: dict,
+    sort_by_id: bool = False,
+    token_budget: Optional[int] = None,
+    model: str = 'gpt-5-nano'
+) -> str:
+    """Format Chroma query results as the textbook context block ('' if empty).
+
+    With a `token_budget`, passages are packed by `pack_passages` so the block
+    never exceeds it, whatever the chapter layout.
+    """
+    if not results['documents'] or not results['documents'][0]:
+        return ''
+
+    hits = list(zip(results['ids'][0], results['documents'][0], results['metadatas'][0]))
+    if token_budget is not None:
+        hits = pack_passages(hits, token_budget, model)
+    if sort_by_id:
+        # Same passages -> byte-identical context, whatever their rank
+        hits.sort(key=lambda hit: hit[0])
+
+    context_parts = ["Relevant textbook content:", SEPARATOR]
+    for _, doc, metadata in hits:
+        context_parts.append(_header(metadata))
+        context_parts.append(doc)
+        context_parts.append(SEPARATOR)
+    return "\n".join(context_parts)
+
+
+class ChatEngine:
+    # Label for this front end in metrics and logs
+    frontend = 'engine'
+
+    def __init__(
+        self,
+        model: str,
+        prompt: LoadedPrompt | str,
+        show_reasoning: bool = False,
+        reasoning_effort: str | None = None,
+        collection_name: Optional[str] = None,
+        chapter: Optional[str] = None,
+        db_path: Optional[str] = None,
+        top_k: int = 3,
+        rerank: bool = False,
+        context_tokens: Optional[int] = DEFAULT_CONTEXT_TOKENS,
+        response_cache: Optional[SemanticResponseCache] = None,
+        history_budget: Optional[int] = None,
+        prompt_layout: str = 'inline',
+        client: Optional[OpenAI] = None,
+        async_client: Optional[AsyncOpenAI] = None
+    ):
+        # Defaults to the process-wide clients from `openai_clients`
+        self._client = client
+        self._ai = async_client
+        self.model = model
+        self.show_reasoning = show_reasoning
+        self.reasoning = {}
+        if show_reasoning:
+            self.reasoning['summary'] = 'auto'
+        if 'gpt-5' in self.model and reasoning_effort:
+            self.reasoning['effort'] = reasoning_effort
+
+        self.usage = UsageTracker(model)
+        self.usage_markdown = format_usage_markdown(self.model, self.usage)
+
+        # Database parameters
+        self.collection_name = collection_name
+        self.chapter = chapter
+        self.db_path = db_path
+        self.top_k = top_k
+        self.rerank = rerank
+        self.context_tokens = context_tokens
+        self.use_rag = collection_name is not None
+        self.response_cache = response_cache
+
+        if isinstance(prompt, LoadedPrompt):
+            # Hashed and counted once by the prompt registry
+            self._prompt, self.prompt_hash, system_tokens = prompt.text, prompt.sha256, prompt.token_count
+        else:
+            self._prompt, self.prompt_hash, system_tokens = prompt, text_hash(prompt), None
+        self.history = ConversationHistory(self._prompt, model, history_budget, prompt_layout, system_tokens)
+        # Routes requests sharing this prompt to the same prompt-cache shard
+        self._prompt_cache_key = text_hash(f"{model}\x1f{self.prompt_hash}")[:32]
+
+    @classmethod
+    def from_persona(cls, persona: str, **overrides) -> 'ChatEngine':
+        """Build an engine for one of `PERSONAS`, grounded in the default textbook."""
+        settings = dict(
+            collection_name=DEFAULT_COLLECTION,
+            db_path=DEFAULT_DB_PATH,
+        )
+        settings.update({key: value for key, value in PERSONAS[persona].items() if key != 'session_key'})
+        settings.update(overrides)
+        prompt_file = settings.pop('prompt_file')
+        if 'prompt' not in settings:
+            settings['prompt'] = load_prompt(DEXTER_DIR / prompt_file)
+        engine = cls(**settings)
+        engine.frontend = persona
+        return engine
+
+    @property
+    def client(self) -> OpenAI:
+        return self._client if self._client is not None else get_client()
+
+    @client.setter
+    def client(self, client: OpenAI):
+        self._client = client
+
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        return self._ai if self._ai is not None else get_async_client()
+
+    # Session state
+
+    def to_state(self) -> dict:
+        """Conversation and usage as JSON-serializable data, for `session_store`."""
+        return {'history': self.history.to_state(), 'usage': self.usage.to_state()}
+
+    def load_state(self, state: dict):
+        """Resume a conversation saved by `to_state` on an engine configured the same way."""
+        self.history.load_state(state['history'])
+        self.usage.load_state(state['usage'])
+        self.usage_markdown = format_usage_markdown(self.model, self.usage, self.history.stats())
+
+    def transcript(self) -> list:
+        """The conversation so far as chat messages ({'role', 'content'})."""
+        return self.history.transcript()
+
+    # Retrieval
+
+    def _retrieve_context(self, user_message: str) -> str:
+        """Query the textbook database and format the relevant context ('' if none)."""
+        if not self.use_rag:
+            return ''
+        try:
+            with RETRIEVAL_TIME.time(collection=self.collection_name):
+                results = query_textbook(
+                    collection_name=self.collection_name,
+                    query_text=user_message,
+                    chapter=self.chapter,
+                    top_k=self.top_k,
+                    persist_dir=self.db_path,
+                    client=self.client,
+                    rerank=self.rerank
+                )
+            return format_context(
+                results,
+                sort_by_id=self.history.layout == 'prefix',
+                token_budget=self.context_tokens,
+                model=self.model
+            )
+        except Exception as e:
+            print(f"Warning: Failed to query database: {e}")
+            return ''
+
+    async def _aretrieve_context(self, user_message: str) -> str:
+        """Async version of `_retrieve_context`."""
+        if not self.use_rag:
+            return ''
+        try:
+            with RETRIEVAL_TIME.time(collection=self.collection_name):
+                results = await aquery_textbook(
+                    collection_name=self.collection_name,
+                    query_text=user_message,
+                    chapter=self.chapter,
+                    top_k=self.top_k,
+                    persist_dir=self.db_path,
+                    client=self.async_client,
+                    rerank=self.rerank
+                )
+            return format_context(
+                results,
+                sort_by_id=self.history.layout == 'prefix',
+                token_budget=self.context_tokens,
+                model=self.model
+            )
+        except Exception as e:
+            print(f"Warning: Failed to query database: {e}")
+            return ''
+
+    # Turn bookkeeping shared by the sync and async paths
+
+    def _uses_cache(self) -> bool:
+        # Cached answers only fit the opening question of a conversation
+        return self.response_cache is not None and not self.history.turns
+
+    def _replay(self, user_message: str, context: str, cached: str):
+        self.history.add_user(user_message, context)
+        for chunk in re.findall(r'\s*\S+\s*', cached):
+            yield 'output', chunk
+        self.history.add_output([{'role': 'assistant', 'content': cached}])
+
+    def _request(self) -> dict:
+        request = dict(input=self.history.build(), model=self.model)
+        if self.reasoning:
+            request['reasoning'] = self.reasoning
+        if self.history.layout == 'prefix':
+            request['extra_body'] = {'prompt_cache_key': self._prompt_cache_key}
+        return request
+
+    @staticmethod
+    def _delta(event):
+        if event.type == "response.output_text.delta":
+            return 'output', event.delta
+        if event.type == "response.reasoning_summary_text.delta":
+            return 'reasoning', event.delta
+        return None
+
+    def _finish(self, response, timer: TurnTimer):
+        self.usage.add(response.usage)
+        self.history.add_output(response.output)
+        self.usage_markdown = format_usage_markdown(self.model, self.usage, self.history.stats())
+        timer.finish('model', self.usage.turn(), self.usage.turn_cost())
+
+    # Streaming
+
+    async def get_response(self, user_message: str):
+        """Stream ('output' | 'reasoning', text) pairs for `user_message` (async)."""
+        timer = TurnTimer(self.model, self.frontend)
+        context = await self._aretrieve_context(user_message)
+        timer.retrieved()
+        cache_key = SemanticResponseCache.make_key(self.model, self.prompt_hash, context)
+
+        use_cache = self._uses_cache()
+        if use_cache:
+            try:
+                cached = await self.response_cache.alookup(user_message, cache_key, self.async_client)
+            except Exception as e:
+                print(f"Warning: Response cache lookup failed: {e}")
+                cached = None
+            if cached is not None:
+                for item in self._replay(user_message, context, cached):
+                    timer.delta(item[0])
+                    yield item
+                timer.finish('cache')
+                return
+
+        self.history.add_user(user_message, context)
+        output = []
+        async with self.async_client.responses.stream(**self._request()) as stream:
+            async for event in stream:
+                delta = self._delta(event)
+                if delta is not None:
+                    if delta[0] == 'output':
+                        output.append(delta[1])
+                    timer.delta(delta[0])
+                    yield delta
+
+            self._finish(await stream.get_final_response(), timer)
+
+        if use_cache and output:
+            try:
+                await self.response_cache.astore(user_message, cache_key, ''.join(output), self.async_client)
+            except Exception as e:
+                print(f"Warning: Response cache store failed: {e}")
+
+    def stream_response(self, user_message: str):
+        """Stream ('output' | 'reasoning', text) pairs for `user_message` (sync)."""
+        timer = TurnTimer(self.model, self.frontend)
+        context = self._retrieve_context(user_message)
+        timer.retrieved()
+        cache_key = SemanticResponseCache.make_key(self.model, self.prompt_hash, context)
+
+        use_cache = self._uses_cache()
+        if use_cache:
+            try:
+                cached = self.response_cache.lookup(user_message, cache_key, self.client)
+            except Exception as e:
+                print(f"Warning: Response cache lookup failed: {e}")
+                cached = None
+            if cached is not None:
+                for item in self._replay(user_message, context, cached):
+                    timer.delta(item[0])
+                    yield item
+                timer.finish('cache')
+                return
+
+        self.history.add_user(user_message, context)
+        output = []
+        with self.client.responses.stream(**self._request()) as stream:
+            for event in stream:
+                delta = self._delta(event)
+                if delta is not None:
+                    if delta[0] == 'output':
+                        output.append(delta[1])
+                    timer.delta(delta[0])
+                    yield delta
+
+            self._finish(stream.get_final_response(), timer)
+
+        if use_cache and output:
+            try:
+                self.response_cache.store(user_message, cache_key, ''.join(output), self.client)
+            except Exception as e:
+                print(f"Warning: Response cache store failed: {e}")
@@ -1,10 +1,34 @@
 from __future__ import annotations
 
-from typing import Optional
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import islice
+from pathlib import Path
+from typing import Iterable, Optional
+import asyncio
+import functools
+import math
 import os
+import random
+import threading
+import time
 
 import chromadb
-from chromadb.utils.embedding_functions import OpenAIEmbeddingFunction
+from chromadb.errors import NotFoundError
+from chromadb.utils.embedding_functions import ONNXMiniLM_L6_V2, OpenAIEmbeddingFunction
+from openai import AsyncOpenAI, OpenAI
+
+import bm25
+from embedding_cache import CachedEmbeddingFunction, get_embedding_cache
+from metrics import CHROMA_QUERY_TIME, EMBEDDING_TIME, QUERY_FLIGHTS
+from openai_clients import get_async_client, get_client
+from sidecar import FileCache, read_json, sidecar_path, write_json
+
+
+def resolve_persist_dir(persist_dir: Optional[str] = None) -> Optional[str]:
+    """Absolute database path from `persist_dir` or `CHROMA_PERSIST_DIR` (None: in-memory)."""
+    path = persist_dir or os.environ.get("CHROMA_PERSIST_DIR")
+    return os.path.abspath(path) if path else None
 
 
 def get_chroma_client(persist_dir: Optional[str] = None) -> chromadb.Client:
@@ -20,18 +44,333 @@ def get_chroma_client(persist_dir: Optional[str] = None) -> chromadb.Client:
     return chromadb.Client()
 
 
-def get_openai_embedding_function(model_name: str = "text-embedding-3-small") -> OpenAIEmbeddingFunction:
+DEFAULT_EMBEDDING_MODEL = "text-embedding-3-small"
+
+# Embedding models that run on the local CPU instead of the OpenAI API
+LOCAL_EMBEDDING_MODELS = {
+    "all-MiniLM-L6-v2": ONNXMiniLM_L6_V2,
+}
+
+_local_embedding_functions = {}
+_local_lock = threading.Lock()
+
+
+def is_local_model(model_name: str) -> bool:
+    return model_name in LOCAL_EMBEDDING_MODELS
+
+
+def get_openai_embedding_function(model_name: str = "text-embedding-3-small", cache: bool = True):
     """Helper to create an OpenAI embedding function (uses OPENAI_API_KEY).
+
+    Unless `cache` is False (or `EMBEDDING_CACHE_PATH=off`), the function is
+    wrapped in a `CachedEmbeddingFunction` so previously embedded text is
+    served from the local on-disk cache instead of the API.
+    """
+    embedding_function = OpenAIEmbeddingFunction(model_name=model_name)
+    embedding_cache = get_embedding_cache() if cache else None
+    if embedding_cache is None:
+        return embedding_function
+    return CachedEmbeddingFunction(embedding_function, model_name, embedding_cache)
+
+
+def get_local_embedding_function(model_name: str = "all-MiniLM-L6-v2", cache: bool = True):
+    """Return the process-wide local (ONNX, CPU) embedding function for `model_name`.
+
+    The model is loaded once and embeds documents in batches; like the OpenAI
+    helper it is wrapped in the on-disk embedding cache unless disabled.
+    """
+    with _local_lock:
+        embedding_function = _local_embedding_functions.get(model_name)
+        if embedding_function is None:
+            embedding_function = LOCAL_EMBEDDING_MODELS[model_name](preferred_providers=["CPUExecutionProvider"])
+            _local_embedding_functions[model_name] = embedding_function
+    embedding_cache = get_embedding_cache() if cache else None
+    if embedding_cache is None:
+        return embedding_function
+    return CachedEmbeddingFunction(embedding_function, model_name, embedding_cache)
+
+
+def get_embedding_function(model_name: str = DEFAULT_EMBEDDING_MODEL, cache: bool = True):
+    """Return the embedding function for `model_name`: local if listed in
+    `LOCAL_EMBEDDING_MODELS`, otherwise OpenAI."""
+    if is_local_model(model_name):
+        return get_local_embedding_function(model_name, cache)
+    return get_openai_embedding_function(model_name, cache)
+
+
+def collection_embedding_model(collection) -> str:
+    """The embedding model a collection was built with.
+
+    Read from the `embedding_model` collection metadata; collections created
+    before it was recorded fall back to Chroma's persisted embedding function
+    config, then to `DEFAULT_EMBEDDING_MODEL`.
     """
-    return OpenAIEmbeddingFunction(model_name=model_name)
+    model = (collection.metadata or {}).get("embedding_model")
+    if model:
+        return model
+    configuration = getattr(collection, "configuration_json", None) or {}
+    embedding_function = configuration.get("embedding_function") or {}
+    for name, function in LOCAL_EMBEDDING_MODELS.items():
+        if embedding_function.get("name") == function.name():
+            return name
+    return (embedding_function.get("config") or {}).get("model_name") or DEFAULT_EMBEDDING_MODEL
 
 
-def get_or_create_collection(client: chromadb.Client, name: str, embedding_function: Optional[OpenAIEmbeddingFunction] = None):
+def partition_map_path(persist_dir: str) -> Path:
+    """Location of the chapter partition map (see `sidecar`)."""
+    return sidecar_path(persist_dir, "partitions.json")
+
+
+def get_or_create_collection(client: chromadb.Client, name: str, embedding_function=None, metadata: Optional[dict] = None):
     """Get or create a Chroma collection with a default OpenAI embedding function.
+
+    `metadata` (e.g. `{"hnsw:space": "cosine"}`) only applies when the
+    collection is created.
     """
     if embedding_function is None:
         embedding_function = get_openai_embedding_function()
-    return client.get_or_create_collection(name=name, embedding_function=embedding_function)
+    return client.get_or_create_collection(name=name, embedding_function=embedding_function, metadata=metadata)
+
+
+class ChromaPool:
+    """Process-wide, thread-safe cache of Chroma clients and collections.
+
+    Opening a `PersistentClient`, loading its HNSW segment and building an
+    embedding function is expensive, so collections are cached per
+    (persist_dir, collection_name, embedding_model). `persist_dir=None` is the
+    in-memory `chromadb.Client()` path and is pooled the same way.
+
+    New collections record their embedding model in metadata; opening an
+    existing one without naming a model uses the recorded model, and naming a
+    different one raises `ValueError`.
+
+    The pool also holds the chapter partition map per database (see
+    `register_partitions`), which `query_textbook` uses for routing.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._clients = {}
+        self._collections = {}
+        self._models = {}
+        self._partitions = FileCache()  # persist_dir -> partition map
+
+    def get_client(self, persist_dir: Optional[str] = None) -> chromadb.Client:
+        """Return the pooled client for `persist_dir` (or the env/in-memory default)."""
+        key = resolve_persist_dir(persist_dir)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = get_chroma_client(key)
+                self._clients[key] = client
+            return client
+
+    def get_collection(
+        self,
+        collection_name: str,
+        persist_dir: Optional[str] = None,
+        embedding_model: Optional[str] = None,
+        metadata: Optional[dict] = None
+    ):
+        """Return the pooled collection, creating the client/collection on first use.
+
+        `embedding_model=None` means the model recorded for an existing
+        collection, or `DEFAULT_EMBEDDING_MODEL` for a new one.
+        """
+        path = resolve_persist_dir(persist_dir)
+        with self._lock:
+            recorded = self._models.get((path, collection_name))
+            if recorded is None:
+                recorded = self._recorded_model(self.get_client(persist_dir), collection_name)
+                if recorded is not None:
+                    self._models[(path, collection_name)] = recorded
+            if recorded is not None and embedding_model is not None and embedding_model != recorded:
+                raise ValueError(
+                    f"Collection '{collection_name}' was built with embedding model '{recorded}', "
+                    f"not '{embedding_model}'"
+                )
+            embedding_model = recorded or embedding_model or DEFAULT_EMBEDDING_MODEL
+
+            key = (path, collection_name, embedding_model)
+            collection = self._collections.get(key)
+            if collection is None:
+                client = self.get_client(persist_dir)
+                metadata = {**(metadata or {}), "embedding_model": embedding_model}
+                try:
+                    embedding_function = get_embedding_function(embedding_model)
+                except ValueError:
+                    # No OPENAI_API_KEY in the environment (e.g. a key entered in
+                    # the Streamlit UI): callers embed with their own client
+                    collection = client.get_or_create_collection(name=collection_name, metadata=metadata)
+                else:
+                    collection = get_or_create_collection(client, collection_name, embedding_function, metadata)
+                self._collections[key] = collection
+                self._models[(path, collection_name)] = embedding_model
+            return collection
+
+    @staticmethod
+    def _recorded_model(client, collection_name: str) -> Optional[str]:
+        try:
+            return collection_embedding_model(client.get_collection(collection_name))
+        except NotFoundError:
+            return None
+
+    def _partition_map(self, path: Optional[str]) -> dict:
+        """{collection: {chapter: partition collection}} for the database at `path`."""
+        return self._partitions.get(
+            path, partition_map_path(path) if path else None, load=read_json, missing=dict
+        )
+
+    def get_partitions(self, collection_name: str, persist_dir: Optional[str] = None) -> dict:
+        """{chapter: partition collection name} for a partitioned collection ({} if not partitioned)."""
+        with self._lock:
+            return dict(self._partition_map(resolve_persist_dir(persist_dir)).get(collection_name, {}))
+
+    def register_partitions(self, collection_name: str, partitions: dict, persist_dir: Optional[str] = None):
+        """Record (replace) the chapter -> partition collection map of `collection_name`."""
+        path = resolve_persist_dir(persist_dir)
+        with self._lock:
+            partition_map = dict(self._partition_map(path))
+            if partitions:
+                partition_map[collection_name] = dict(partitions)
+            else:
+                partition_map.pop(collection_name, None)
+            mtime = None
+            if path:
+                mtime = write_json(partition_map_path(path), partition_map, indent=2, sort_keys=True)
+            self._partitions.set(path, partition_map, mtime)
+        _flights.invalidate(collection_name)
+
+    def reset(self):
+        """Forget cached collections so the next lookup re-opens them.
+
+        Use this after a collection was deleted or rebuilt out of process.
+        Clients are kept.
+        """
+        with self._lock:
+            self._collections.clear()
+            self._models.clear()
+            # In-memory databases have no file to reload their map from
+            self._partitions.clear(keep=lambda path: path is None)
+
+    def close(self):
+        """Drop every cached collection and client and release their resources."""
+        with self._lock:
+            self._collections.clear()
+            self._models.clear()
+            self._partitions.clear()
+            clients = list(self._clients.values())
+            self._clients.clear()
+        if clients:
+            # Chroma shares one System per path inside the process; clearing the
+            # cache stops it and closes the sqlite/HNSW handles.
+            clear_cache = getattr(clients[0], "clear_system_cache", None)
+            if clear_cache is not None:
+                clear_cache()
+
+
+_pool = ChromaPool()
+
+
+def get_pool() -> ChromaPool:
+    """Return the process-wide `ChromaPool` used by the helpers in this module."""
+    return _pool
+
+
+class SingleFlight:
+    """Coalesces identical concurrent textbook queries and caches recent results.
+
+    Queries are keyed on (database, collection, normalized query, chapter,
+    top_k, search options). The first caller runs the query; callers with
+    the same key arriving meanwhile wait for its result instead of issuing
+    their own embedding request and Chroma search. Results are then kept for
+    `ttl` seconds in an LRU of `max_entries`, tagged with the write
+    generation of every collection they read, so a write to any of them
+    (`invalidate`) makes the entry stale.
+    """
+
+    def __init__(self, ttl: float = 30.0, max_entries: int = 256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._in_flight = {}         # key -> Future
+        self._recent = OrderedDict()  # key -> (expires, generations, results)
+        self._generations = {}       # collection name -> write count
+
+    @staticmethod
+    def make_key(persist_dir, collection_name, query_text, chapter, top_k, *options) -> tuple:
+        normalized = " ".join(query_text.casefold().split())
+        return (resolve_persist_dir(persist_dir), collection_name, normalized, chapter, top_k, *options)
+
+    def generations(self, names) -> tuple:
+        with self._lock:
+            return tuple(self._generations.get(name, 0) for name in names)
+
+    def invalidate(self, *collection_names: str):
+        """Mark collections as written to; cached results that read them are dropped."""
+        with self._lock:
+            for name in collection_names:
+                self._generations[name] = self._generations.get(name, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._recent.clear()
+
+    def begin(self, key: tuple, names) -> tuple:
+        """Return (cached results, None), (None, in-flight future) or (None, None) for the leader.
+
+        The leader must call `finish` with the generations it read before querying.
+        """
+        with self._lock:
+            entry = self._recent.get(key)
+            if entry is not None:
+                expires, generations, results = entry
+                if expires > time.monotonic() and generations == tuple(self._generations.get(n, 0) for n in names):
+                    self._recent.move_to_end(key)
+                    QUERY_FLIGHTS.inc(outcome="hit")
+                    return _copy_results(results), None
+                del self._recent[key]
+            future = self._in_flight.get(key)
+            if future is not None:
+                QUERY_FLIGHTS.inc(outcome="coalesced")
+                return None, future
+            self._in_flight[key] = Future()
+            QUERY_FLIGHTS.inc(outcome="miss")
+            return None, None
+
+    def finish(self, key: tuple, names, generations: tuple, results: Optional[dict] = None, error: Optional[BaseException] = None):
+        """Hand the leader's results (or error) to waiting callers and cache them."""
+        with self._lock:
+            future = self._in_flight.pop(key)
+            current = tuple(self._generations.get(n, 0) for n in names)
+            if error is None and self.ttl > 0 and current == generations:
+                self._recent[key] = (time.monotonic() + self.ttl, generations, results)
+                while len(self._recent) > self.max_entries:
+                    self._recent.popitem(last=False)
+        if error is None:
+            future.set_result(results)
+        else:
+            # Waiting callers retry on their own (e.g. the leader's API key was rejected)
+            future.set_exception(error if isinstance(error, Exception) else RuntimeError("query was cancelled"))
+
+
+def _copy_results(results: dict) -> dict:
+    # Callers get their own lists, so nobody mutates a cached result
+    return {
+        key: [list(row) if isinstance(row, list) else row for row in value] if isinstance(value, list) else value
+        for key, value in results.items()
+    }
+
+
+_flights = SingleFlight(
+    ttl=float(os.environ.get("QUERY_CACHE_TTL", "30")),
+    max_entries=int(os.environ.get("QUERY_CACHE_SIZE", "256"))
+)
+
+
+def get_single_flight() -> SingleFlight:
+    """Return the process-wide `SingleFlight` used by `query_textbook`."""
+    return _flights
 
 
 def add_embeddings_with_metadata(
@@ -63,13 +402,111 @@ def add_embeddings_with_metadata(
     """
 
 
+def _is_retryable(error: Exception) -> bool:
+    """True for rate-limit, timeout and 5xx errors from the embedding API."""
+    status = getattr(error, "status_code", None)
+    if status == 429 or (status is not None and status >= 500):
+        return True
+    return type(error).__name__ in ("RateLimitError", "APITimeoutError", "APIConnectionError")
+
+
+def _embed_with_backoff(embedding_function, documents: list[str], max_retries: int = 6):
+    """Embed one batch, backing off exponentially (or per Retry-After) on rate limits."""
+    for attempt in range(max_retries + 1):
+        try:
+            return embedding_function(documents)
+        except Exception as e:
+            if attempt == max_retries or not _is_retryable(e):
+                raise
+            response = getattr(e, "response", None)
+            retry_after = response.headers.get("retry-after") if response is not None else None
+            try:
+                delay = float(retry_after)
+            except (TypeError, ValueError):
+                delay = min(60.0, 2 ** attempt) * (0.5 + random.random())
+            time.sleep(delay)
+
+
+def bulk_add(
+    collection,
+    records: Iterable[tuple[str, str, dict]],
+    embedding_function,
+    batch_size: int = 100,
+    max_workers: int = 4
+) -> dict:
+    """Embed and write (id, document, metadata) records in batches.
+    
+    Up to `max_workers` embedding requests run concurrently with rate-limit
+    backoff, and each finished batch is upserted into Chroma. `records` may be
+    any iterable, so only the batches in flight are held in memory. IDs that
+    are already in the collection are skipped, so re-running after a crash
+    resumes where the previous run stopped.
+    
+    Args:
+        collection: Chroma collection to write to
+        records: Iterable of (id, document, metadata) tuples
+        embedding_function: Function used to embed each batch of documents
+        batch_size: Number of documents per embedding request / write
+        max_workers: Number of concurrent embedding requests
+    
+    Returns:
+        Dictionary with `added`, `skipped`, `seconds` and `docs_per_sec`
+    """
+    records = iter(records)
+    added = 0
+    skipped = 0
+    start = time.perf_counter()
+
+    def write(batch, future):
+        nonlocal added
+        ids, documents, metadatas = zip(*batch)
+        collection.upsert(
+            ids=list(ids),
+            embeddings=future.result(),
+            documents=list(documents),
+            metadatas=[metadata or {} for metadata in metadatas]
+        )
+        _flights.invalidate(collection.name)
+        added += len(batch)
+        elapsed = time.perf_counter() - start
+        print(f"  {added} documents written ({added / elapsed:.1f} docs/sec)")
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="embed") as executor:
+        in_flight = deque()
+        while batch := list(islice(records, batch_size)):
+            existing = set(collection.get(ids=[record[0] for record in batch], include=[])["ids"])
+            if existing:
+                skipped += len(existing)
+                batch = [record for record in batch if record[0] not in existing]
+                if not batch:
+                    continue
+
+            documents = [record[1] for record in batch]
+            in_flight.append((batch, executor.submit(_embed_with_backoff, embedding_function, documents)))
+            if len(in_flight) >= max_workers:
+                write(*in_flight.popleft())
+
+        while in_flight:
+            write(*in_flight.popleft())
+
+    elapsed = time.perf_counter() - start
+    return {
+        'added': added,
+        'skipped': skipped,
+        'seconds': elapsed,
+        'docs_per_sec': added / elapsed if elapsed else 0.0,
+    }
+
+
 def add_to_database(
     collection_name: str,
     ids: list[str],
     documents: list[str],
     metadatas: list[dict] = None,
     persist_dir: Optional[str] = None,
-    embedding_model: str = "text-embedding-3-small"
+    embedding_model: Optional[str] = None,
+    batch_size: Optional[int] = None,
+    max_workers: int = 4
 ):
     """Add documents to an existing database collection in one call.
     
@@ -79,58 +516,201 @@ def add_to_database(
         documents: Text documents to embed
         metadatas: List of metadata dictionaries (one per document)
         persist_dir: Path to persistent database (if None, uses env var or in-memory)
-        embedding_model: OpenAI embedding model to use
+        embedding_model: Embedding model for a new collection (OpenAI or one
+            of `LOCAL_EMBEDDING_MODELS`); existing collections use their recorded model
+        batch_size: If set, ingest in batches of this size via `bulk_add`
+        max_workers: Concurrent embedding requests in bulk mode
+    
+    Returns:
+        `bulk_add` statistics in bulk mode, otherwise None
     """
-    client = get_chroma_client(persist_dir)
-    embedding_function = get_openai_embedding_function(embedding_model)
-    collection = get_or_create_collection(client, collection_name, embedding_function)
-    add_embeddings_with_metadata(collection, ids, documents, metadatas)
+    collection = _pool.get_collection(collection_name, persist_dir, embedding_model)
+    records = list(zip(ids, documents, metadatas or [{}] * len(documents)))
+    if batch_size is None:
+        add_embeddings_with_metadata(collection, ids, documents, metadatas)
+        stats = None
+    else:
+        stats = bulk_add(
+            collection,
+            records,
+            get_embedding_function(collection_embedding_model(collection)),
+            batch_size=batch_size,
+            max_workers=max_workers
+        )
+    bm25.update_index(resolve_persist_dir(persist_dir), collection, add=records)
+    _flights.invalidate(collection.name)
+    return stats
+
+
+def delete_from_database(
+    collection_name: str,
+    ids: list[str],
+    persist_dir: Optional[str] = None,
+    embedding_model: Optional[str] = None
+):
+    """Delete documents by ID from a database collection.
+    
+    Args:
+        collection_name: Name of the collection to delete from
+        ids: Identifiers of the documents to remove
+        persist_dir: Path to persistent database (if None, uses env var or in-memory)
+        embedding_model: Embedding model the collection was built with (default: recorded)
+    """
+    if ids:
+        collection = _pool.get_collection(collection_name, persist_dir, embedding_model)
+        collection.delete(ids=ids)
+        bm25.update_index(resolve_persist_dir(persist_dir), collection, remove=ids)
+        _flights.invalidate(collection.name)
+
+
+def embed_texts(texts: list[str], model: str = "text-embedding-3-small", client: Optional[OpenAI] = None) -> list[list[float]]:
+    """Embed `texts` with `client` (default: OPENAI_API_KEY), via the embedding cache.
+
+    Local models embed on this machine and ignore `client`.
+    """
+    if is_local_model(model):
+        return list(get_local_embedding_function(model)(texts))
+
+    embedding_cache = get_embedding_cache()
+    vectors = embedding_cache.get_many(model, texts) if embedding_cache else [None] * len(texts)
+
+    missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+    if missing:
+        with EMBEDDING_TIME.time(model=model):
+            response = (client or _get_openai()).embeddings.create(model=model, input=missing)
+        embedded = {text: item.embedding for text, item in zip(missing, response.data)}
+        if embedding_cache is not None:
+            embedding_cache.put_many(model, missing, list(embedded.values()))
+        vectors = [embedded[text] if vector is None else vector for text, vector in zip(texts, vectors)]
+
+    return vectors
 
 
 def query_collection(
     collection,
     query_text: str,
     chapter: Optional[str] = None,
-    top_k: int = 5
+    top_k: int = 5,
+    query_embedding: Optional[list[float]] = None,
+    lexical_index: Optional[bm25.BM25Index] = None,
+    rerank: bool = False
 ) -> dict:
     """Query a Chroma collection with optional chapter filtering.
     
+    With a `lexical_index`, vector and BM25 candidates are fused by
+    reciprocal rank fusion (and optionally reranked by exact term/phrase
+    overlap), so exact matches like "f(x) = 2x + 3" surface even when the
+    embedding misses them.
+    
     Args:
         collection: Chroma collection to query
         query_text: The search query text
         chapter: Optional chapter to filter by (filters metadata['chapter'])
         top_k: Number of top results to return (default: 5)
+        query_embedding: Precomputed embedding of `query_text`; if omitted the
+            collection's embedding function embeds it
+        lexical_index: BM25 index of the collection for hybrid retrieval
+        rerank: Rerank the fused candidates (hybrid only)
     
     Returns:
         Dictionary with query results including:
         - ids: Document IDs
         - documents: Document content
         - metadatas: Document metadata (chapter, section, subsection)
-        - distances: Distance scores
+        - distances: Distance scores (None for lexical-only hits)
     """
     where_filter = None
     if chapter:
         where_filter = {"chapter": chapter}
     
-    results = collection.query(
-        query_texts=[query_text],
-        n_results=top_k,
-        where=where_filter
-    )
+    n_results = top_k if lexical_index is None else max(4 * top_k, 10)
+    with CHROMA_QUERY_TIME.time(collection=collection.name):
+        if query_embedding is None:
+            results = collection.query(
+                query_texts=[query_text],
+                n_results=n_results,
+                where=where_filter
+            )
+        else:
+            results = collection.query(
+                query_embeddings=[query_embedding],
+                n_results=n_results,
+                where=where_filter
+            )
+    
+    if lexical_index is not None:
+        results = _fuse(collection, query_text, results, lexical_index, chapter, top_k, n_results, rerank)
     
     return results
 
 
+def _fuse(collection, query_text, vector_results, lexical_index, chapter, top_k, candidates, rerank) -> dict:
+    """Merge vector results with BM25 hits (RRF) into the Chroma result shape."""
+    hits = {}
+    if vector_results['ids'] and vector_results['ids'][0]:
+        for doc_id, document, metadata, distance in zip(
+            vector_results['ids'][0],
+            vector_results['documents'][0],
+            vector_results['metadatas'][0],
+            vector_results['distances'][0]
+        ):
+            hits[doc_id] = (document, metadata, distance)
+    lexical_ids = [doc_id for doc_id, _ in lexical_index.search(query_text, candidates, chapter)]
+    
+    fused = bm25.reciprocal_rank_fusion([list(hits), lexical_ids])
+    if rerank:
+        fused = fused[:candidates]
+    else:
+        fused = fused[:top_k]
+    
+    missing = [doc_id for doc_id, _ in fused if doc_id not in hits]
+    if missing:
+        extra = collection.get(ids=missing, include=['documents', 'metadatas'])
+        for doc_id, document, metadata in zip(extra['ids'], extra['documents'], extra['metadatas']):
+            hits[doc_id] = (document, metadata, None)
+    fused = [(doc_id, score) for doc_id, score in fused if doc_id in hits]
+    
+    if rerank:
+        fused = bm25.rerank_by_overlap(
+            query_text,
+            [(doc_id, hits[doc_id][0] or '', score) for doc_id, score in fused]
+        )[:top_k]
+    
+    ids = [doc_id for doc_id, _ in fused]
+    return {
+        'ids': [ids],
+        'documents': [[hits[doc_id][0] for doc_id in ids]],
+        'metadatas': [[hits[doc_id][1] for doc_id in ids]],
+        'distances': [[hits[doc_id][2] for doc_id in ids]],
+        'scores': [[score for _, score in fused]],
+    }
+
+
 def query_textbook(
     collection_name: str,
     query_text: str,
     chapter: Optional[str] = None,
     top_k: int = 5,
-    persist_dir: Optional[str] = None
+    persist_dir: Optional[str] = None,
+    embedding_model: Optional[str] = None,
+    client: Optional[OpenAI] = None,
+    hybrid: bool = True,
+    rerank: bool = False
 ) -> dict:
     """Query the textbook database with optional chapter filtering.
     
-    Convenience function that handles client/collection setup.
+    Convenience function that handles client/collection setup. Clients and
+    collections come from the process-wide pool, so repeated calls reuse them.
+    By default vector results are fused with the collection's BM25 index.
+    
+    If the collection was written as per-chapter partitions (see
+    `register_partitions`), a chapter-scoped query goes straight to that
+    chapter's small collection with no metadata filter, and other queries
+    fan out to every partition in parallel and are merged.
+    
+    Identical concurrent queries share one embedding request and search, and
+    results are reused for a short time until the collection is written to
+    (see `SingleFlight`).
     
     Args:
         collection_name: Name of the collection to query (e.g., "chapter-1-functions")
@@ -138,6 +718,13 @@ def query_textbook(
         chapter: Optional chapter to filter results by
         top_k: Number of top results to return (default: 5)
         persist_dir: Path to persistent database (if None, uses env var or in-memory)
+        embedding_model: Embedding model the collection was built with
+            (default: the model recorded in its metadata)
+        client: OpenAI client used to embed the query (e.g. one holding a
+            user-supplied API key); defaults to the collection's embedding function.
+            Collections on a local model embed the query locally.
+        hybrid: Fuse with BM25 lexical results (False: pure vector search)
+        rerank: Rerank the fused candidates by exact term/phrase overlap
     
     Returns:
         Query results with ids, documents, metadatas, and distances
@@ -150,7 +737,276 @@ def query_textbook(
             top_k=3
         )
     """
-    client = get_chroma_client(persist_dir)
-    collection = get_or_create_collection(client, collection_name)
-    return query_collection(collection, query_text, chapter, top_k)
+    args = (collection_name, query_text, chapter, top_k, persist_dir, embedding_model, client, hybrid, rerank)
+    key = SingleFlight.make_key(persist_dir, collection_name, query_text, chapter, top_k, embedding_model, hybrid, rerank)
+    names = _flight_collections(collection_name, persist_dir)
+    results, future = _flights.begin(key, names)
+    if results is not None:
+        return results
+    if future is not None:
+        try:
+            return _copy_results(future.result())
+        except Exception:
+            return _query_textbook(*args)
+
+    generations = _flights.generations(names)
+    try:
+        results = _query_textbook(*args)
+    except BaseException as e:
+        _flights.finish(key, names, generations, error=e)
+        raise
+    _flights.finish(key, names, generations, results)
+    return _copy_results(results)
+
+
+def _flight_collections(collection_name: str, persist_dir: Optional[str]) -> tuple:
+    # Every collection a query on `collection_name` reads: itself and its partitions
+    return (collection_name, *_pool.get_partitions(collection_name, persist_dir).values())
+
+
+def _query_textbook(
+    collection_name, query_text, chapter, top_k, persist_dir, embedding_model, client, hybrid, rerank
+) -> dict:
+    partitions = _pool.get_partitions(collection_name, persist_dir)
+    if partitions:
+        return _query_partitions(
+            route_partitions(partitions, chapter),
+            query_text, top_k, persist_dir, embedding_model, client, hybrid, rerank
+        )
+
+    collection = _pool.get_collection(collection_name, persist_dir, embedding_model)
+    embedding_model = collection_embedding_model(collection)
+    query_embedding = None
+    if client is not None or is_local_model(embedding_model):
+        (query_embedding,) = embed_texts([query_text], embedding_model, client)
+    lexical_index = bm25.get_index(resolve_persist_dir(persist_dir), collection) if hybrid else None
+    return query_collection(collection, query_text, chapter, top_k, query_embedding, lexical_index, rerank)
+
+
+def route_partitions(partitions: dict, chapter: Optional[str] = None) -> list[str]:
+    """Partition collections to search: the chapter's own, or all of them."""
+    if chapter:
+        return [partitions[chapter]] if chapter in partitions else []
+    return list(partitions.values())
+
+
+def merge_results(results: list[dict], top_k: int) -> dict:
+    """Merge per-partition query results into one top-k result.
+
+    Fused results are ordered by their `scores`, vector-only results by distance.
+    """
+    hits = []
+    for result in results:
+        if not result['ids'] or not result['ids'][0]:
+            continue
+        scores = result.get('scores') or [[None] * len(result['ids'][0])]
+        hits.extend(zip(
+            result['ids'][0],
+            result['documents'][0],
+            result['metadatas'][0],
+            result['distances'][0],
+            scores[0]
+        ))
+    hits.sort(key=lambda hit: (-(hit[4] or 0.0), math.inf if hit[3] is None else hit[3]))
+    hits = hits[:top_k]
+
+    merged = {
+        'ids': [[hit[0] for hit in hits]],
+        'documents': [[hit[1] for hit in hits]],
+        'metadatas': [[hit[2] for hit in hits]],
+        'distances': [[hit[3] for hit in hits]],
+    }
+    if any(result.get('scores') for result in results):
+        merged['scores'] = [[hit[4] for hit in hits]]
+    return merged
+
+
+def _query_partitions(names, query_text, top_k, persist_dir, embedding_model, client, hybrid, rerank) -> dict:
+    if not names:
+        return merge_results([], top_k)
+    path = resolve_persist_dir(persist_dir)
+    collections = [_pool.get_collection(name, persist_dir, embedding_model) for name in names]
+    # Embed once for every partition (they share the model)
+    (query_embedding,) = embed_texts([query_text], collection_embedding_model(collections[0]), client)
+    
+    def search(collection):
+        lexical_index = bm25.get_index(path, collection) if hybrid else None
+        return query_collection(collection, query_text, None, top_k, query_embedding, lexical_index, rerank)
     
+    if len(collections) == 1:
+        return search(collections[0])
+    return merge_results(list(_get_executor().map(search, collections)), top_k)
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_async_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Bounded executor for blocking Chroma work (size from `CHROMA_QUERY_WORKERS`)."""
+    global _executor
+    with _async_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=int(os.environ.get("CHROMA_QUERY_WORKERS", "4")),
+                thread_name_prefix="chroma"
+            )
+        return _executor
+
+
+def _get_openai() -> OpenAI:
+    return get_client()
+
+
+def _get_async_openai() -> AsyncOpenAI:
+    return get_async_client()
+
+
+async def run_in_executor(func, *args, **kwargs):
+    """Run a blocking call on the bounded Chroma executor without blocking the loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), functools.partial(func, *args, **kwargs))
+
+
+async def aembed_texts(
+    texts: list[str],
+    model: str = "text-embedding-3-small",
+    client: Optional[AsyncOpenAI] = None
+) -> list[list[float]]:
+    """Embed `texts` with `client` (default: `AsyncOpenAI` on OPENAI_API_KEY), via the embedding cache.
+
+    Local models run on the Chroma executor and ignore `client`.
+    """
+    if is_local_model(model):
+        return list(await run_in_executor(get_local_embedding_function(model), texts))
+
+    embedding_cache = get_embedding_cache()
+    if embedding_cache is None:
+        vectors = [None] * len(texts)
+    else:
+        vectors = await run_in_executor(embedding_cache.get_many, model, texts)
+
+    missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+    if missing:
+        with EMBEDDING_TIME.time(model=model):
+            response = await (client or _get_async_openai()).embeddings.create(model=model, input=missing)
+        embedded = {text: item.embedding for text, item in zip(missing, response.data)}
+        if embedding_cache is not None:
+            await run_in_executor(embedding_cache.put_many, model, missing, list(embedded.values()))
+        vectors = [embedded[text] if vector is None else vector for text, vector in zip(texts, vectors)]
+
+    return vectors
+
+
+async def aquery_collection(
+    collection,
+    query_text: str,
+    chapter: Optional[str] = None,
+    top_k: int = 5,
+    embedding_model: Optional[str] = None,
+    client: Optional[AsyncOpenAI] = None,
+    lexical_index: Optional[bm25.BM25Index] = None,
+    rerank: bool = False
+) -> dict:
+    """Async version of `query_collection`.
+
+    The question is embedded with `AsyncOpenAI` (or the collection's local
+    model) and the HNSW lookup (plus any BM25 fusion) runs on a bounded
+    thread pool, so the event loop keeps serving other sessions.
+    """
+    embedding_model = embedding_model or collection_embedding_model(collection)
+    (query_embedding,) = await aembed_texts([query_text], embedding_model, client)
+    return await run_in_executor(
+        query_collection,
+        collection,
+        query_text,
+        chapter,
+        top_k,
+        query_embedding,
+        lexical_index,
+        rerank
+    )
+
+
+async def aquery_textbook(
+    collection_name: str,
+    query_text: str,
+    chapter: Optional[str] = None,
+    top_k: int = 5,
+    persist_dir: Optional[str] = None,
+    embedding_model: Optional[str] = None,
+    client: Optional[AsyncOpenAI] = None,
+    hybrid: bool = True,
+    rerank: bool = False
+) -> dict:
+    """Async version of `query_textbook` for use inside an event loop.
+
+    Takes the same arguments and returns the same results dictionary, and
+    shares in-flight queries and recent results with `query_textbook`.
+    """
+    args = (collection_name, query_text, chapter, top_k, persist_dir, embedding_model, client, hybrid, rerank)
+    key = SingleFlight.make_key(persist_dir, collection_name, query_text, chapter, top_k, embedding_model, hybrid, rerank)
+    names = _flight_collections(collection_name, persist_dir)
+    results, future = _flights.begin(key, names)
+    if results is not None:
+        return results
+    if future is not None:
+        try:
+            # Shielded: a cancelled waiter must not cancel the shared query
+            return _copy_results(await asyncio.shield(asyncio.wrap_future(future)))
+        except Exception:
+            return await _aquery_textbook(*args)
+
+    generations = _flights.generations(names)
+    try:
+        results = await _aquery_textbook(*args)
+    except BaseException as e:
+        _flights.finish(key, names, generations, error=e)
+        raise
+    _flights.finish(key, names, generations, results)
+    return _copy_results(results)
+
+
+async def _aquery_textbook(
+    collection_name, query_text, chapter, top_k, persist_dir, embedding_model, client, hybrid, rerank
+) -> dict:
+    partitions = _pool.get_partitions(collection_name, persist_dir)
+    if partitions:
+        return await _aquery_partitions(
+            route_partitions(partitions, chapter),
+            query_text, top_k, persist_dir, embedding_model, client, hybrid, rerank
+        )
+
+    collection = await run_in_executor(_pool.get_collection, collection_name, persist_dir, embedding_model)
+    lexical_index = None
+    if hybrid:
+        lexical_index = await run_in_executor(bm25.get_index, resolve_persist_dir(persist_dir), collection)
+    return await aquery_collection(
+        collection,
+        query_text,
+        chapter,
+        top_k,
+        collection_embedding_model(collection),
+        client,
+        lexical_index,
+        rerank
+    )
+
+
+async def _aquery_partitions(names, query_text, top_k, persist_dir, embedding_model, client, hybrid, rerank) -> dict:
+    if not names:
+        return merge_results([], top_k)
+    path = resolve_persist_dir(persist_dir)
+    collections = await asyncio.gather(*(
+        run_in_executor(_pool.get_collection, name, persist_dir, embedding_model) for name in names
+    ))
+    (query_embedding,) = await aembed_texts([query_text], collection_embedding_model(collections[0]), client)
+
+    async def search(collection):
+        lexical_index = await run_in_executor(bm25.get_index, path, collection) if hybrid else None
+        return await run_in_executor(
+            query_collection, collection, query_text, None, top_k, query_embedding, lexical_index, rerank
+        )
+
+    results = await asyncio.gather(*(search(collection) for collection in collections))
+    return results[0] if len(results) == 1 else merge_results(list(results), top_k)
@@ -0,0 +1,209 @@
+"""
+Persistent, content-addressed cache for text embeddings.
+
+Vectors are stored in a local SQLite file keyed by (model, sha256(text)), so
+text that was embedded once (textbook subsections, common student questions)
+never goes back over the network. The store is size-bounded with LRU eviction.
+
+Lookups stay read-only: hits are recorded in memory and their `last_used`
+times written in one batch on the next `put_many` (before it evicts) or
+once `flush_interval` seconds have passed. The entry count is likewise kept
+in memory, so inserts never scan the table.
+"""
+
+from __future__ import annotations
+
+from array import array
+from pathlib import Path
+from typing import Optional
+import os
+import sqlite3
+import threading
+import time
+
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+
+from hashing import text_hash
+from metrics import EMBEDDING_TIME
+
+
+DEFAULT_CACHE_PATH = Path(__file__).parent / "embedding_cache.sqlite3"
+DEFAULT_MAX_ENTRIES = 200_000
+DEFAULT_FLUSH_INTERVAL = 30.0
+
+
+class EmbeddingCache:
+    """SQLite-backed (model, sha256(text)) -> vector store with LRU eviction."""
+
+    def __init__(
+        self,
+        path: str | os.PathLike = DEFAULT_CACHE_PATH,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL
+    ):
+        self.path = str(path)
+        self.max_entries = max_entries
+        self.flush_interval = flush_interval
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._touched = {}  # (model, text hash) -> last used, not yet written
+        self._last_flush = time.monotonic()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL,"
+            " text_hash TEXT NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " last_used REAL NOT NULL,"
+            " PRIMARY KEY (model, text_hash))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        (self._entries,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+
+    def _flush_touches(self):
+        """Write pending `last_used` updates (caller holds the lock and commits)."""
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                [(last_used, model, h) for (model, h), last_used in self._touched.items()]
+            )
+            self._touched.clear()
+        self._last_flush = time.monotonic()
+
+    def get_many(self, model: str, texts: list[str]) -> list[Optional[list[float]]]:
+        """Return the cached vector for each text, or None where it is missing."""
+        hashes = [text_hash(text) for text in texts]
+        found = {}
+        with self._lock:
+            unique = list(set(hashes))
+            for start in range(0, len(unique), 500):
+                chunk = unique[start:start + 500]
+                rows = self._conn.execute(
+                    "SELECT text_hash, vector FROM embeddings"
+                    f" WHERE model = ? AND text_hash IN ({','.join('?' * len(chunk))})",
+                    [model, *chunk]
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                self._touched.update(((model, h), now) for h in found)
+                if time.monotonic() - self._last_flush >= self.flush_interval:
+                    self._flush_touches()
+                    self._conn.commit()
+
+            results = []
+            for h in hashes:
+                blob = found.get(h)
+                if blob is None:
+                    self.misses += 1
+                    results.append(None)
+                else:
+                    self.hits += 1
+                    results.append(array("f", blob).tolist())
+            return results
+
+    def put_many(self, model: str, texts: list[str], vectors: list) -> None:
+        """Store vectors for `texts` and evict least-recently-used entries over the limit."""
+        now = time.time()
+        rows = [
+            (model, text_hash(text), array("f", [float(x) for x in vector]).tobytes(), now)
+            for text, vector in zip(texts, vectors)
+        ]
+        with self._lock:
+            # Vectors are a function of (model, text), so a row stored meanwhile is kept
+            inserted = self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (model, text_hash, vector, last_used) VALUES (?, ?, ?, ?)",
+                rows
+            ).rowcount
+            self._entries += inserted
+            self._flush_touches()
+            if self._entries > self.max_entries:
+                evicted = self._conn.execute(
+                    "DELETE FROM embeddings WHERE rowid IN"
+                    " (SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (self._entries - self.max_entries,)
+                ).rowcount
+                self._entries -= evicted
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        """Hit/miss counters for this process plus the number of stored vectors."""
+        with self._lock:
+            entries = self._entries
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': entries,
+        }
+
+    def close(self):
+        with self._lock:
+            self._flush_touches()
+            self._conn.commit()
+            self._conn.close()
+
+
+class CachedEmbeddingFunction(EmbeddingFunction[Documents]):
+    """Chroma embedding function that consults an `EmbeddingCache` before `inner`.
+
+    It reports the wrapped function's name and config, so collections built
+    with it stay compatible with the plain embedding function.
+    """
+
+    def __init__(self, inner: EmbeddingFunction, model_name: str, cache: EmbeddingCache):
+        self._inner = inner
+        self.model_name = model_name
+        self.cache = cache
+
+    def __call__(self, input: Documents) -> Embeddings:
+        texts = list(input)
+        vectors = self.cache.get_many(self.model_name, texts)
+
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+        if missing:
+            with EMBEDDING_TIME.time(model=self.model_name):
+                embedded = dict(zip(missing, self._inner(missing)))
+            self.cache.put_many(self.model_name, missing, list(embedded.values()))
+            vectors = [embedded[text] if vector is None else vector for text, vector in zip(texts, vectors)]
+
+        return vectors
+
+    def name(self) -> str:
+        return self._inner.name()
+
+    def get_config(self) -> dict:
+        return self._inner.get_config()
+
+    def build_from_config(self, config: dict) -> EmbeddingFunction:
+        return self._inner.build_from_config(config)
+
+    def default_space(self):
+        return self._inner.default_space()
+
+    def supported_spaces(self):
+        return self._inner.supported_spaces()
+
+
+_cache: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """Return the process-wide cache, or None when disabled.
+
+    The location comes from `EMBEDDING_CACHE_PATH` (default: next to this
+    file); set it to `off` to disable caching.
+    """
+    global _cache
+    path = os.environ.get("EMBEDDING_CACHE_PATH", str(DEFAULT_CACHE_PATH))
+    if path.lower() == "off":
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = EmbeddingCache(path)
+        return _cache
@@ -0,0 +1,10 @@
+"""
+Content hashing shared by the prompt registry and the caches.
+"""
+
+import hashlib
+
+
+def text_hash(text: str) -> str:
+    """Hex sha256 of `text` (UTF-8)."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
@@ -0,0 +1,189 @@
+"""
+Token-budgeted conversation history for the Responses API.
+
+Each turn keeps the student's bare question, the textbook context retrieved
+for it and the model's output items. Only the latest turn is sent with its
+context; older turns are sent as bare questions, and the oldest turns are
+dropped once the request would exceed the model's token budget. The system
+prompt is always kept.
+
+Two request layouts are supported:
+
+- `inline`: the context is appended to the latest user message.
+- `prefix`: optimized for prompt caching. The system prompt and the bare
+  history form a byte-identical, append-only prefix; the context follows as
+  its own message, then the question. Old turns are dropped in chunks (down
+  to `COMPACT_TARGET` of the budget) so the prefix stays stable for many
+  turns instead of shifting every turn.
+"""
+
+from __future__ import annotations
+
+from typing import Optional
+
+from tokens import count_tokens
+
+
+# Input-token budget for the history sent with each request.
+MODEL_TOKEN_BUDGETS = {
+    'gpt-5-nano': 8_000,
+    'gpt-5-mini': 12_000,
+    'gpt-4.1-nano': 8_000,
+    'gpt-4.1-mini': 12_000,
+    'gpt-3.5-turbo': 12_000,
+}
+DEFAULT_TOKEN_BUDGET = 16_000
+
+# When over budget, drop old turns until the request fits in this fraction
+COMPACT_TARGET = 0.6
+
+LAYOUTS = ('inline', 'prefix')
+
+
+def with_context(message: str, context: str) -> str:
+    """The user message as sent to the model, with textbook context appended."""
+    if not context:
+        return message
+    return f"{message}\n\nContext from textbook:\n{context}"
+
+
+def _item_text(item) -> str:
+    if isinstance(item, dict):
+        return str(item.get('content', ''))
+    return item.model_dump_json(exclude_none=True)
+
+
+def _item_state(item) -> dict:
+    # Output items as plain dicts; the Responses API accepts them back as input
+    return item if isinstance(item, dict) else item.model_dump(exclude_none=True)
+
+
+def output_text(item) -> str:
+    """Assistant-visible text of one output item (reasoning items have none)."""
+    item = _item_state(item)
+    content = item.get('content', '')
+    if isinstance(content, str):
+        return content if item.get('role', 'assistant') == 'assistant' else ''
+    return ''.join(part.get('text', '') for part in content if part.get('type') == 'output_text')
+
+
+class ConversationHistory:
+    def __init__(
+        self,
+        system_prompt: str,
+        model: str,
+        token_budget: Optional[int] = None,
+        layout: str = 'inline',
+        system_tokens: Optional[int] = None
+    ):
+        if layout not in LAYOUTS:
+            raise ValueError(f"Unknown history layout {layout!r}, expected one of {LAYOUTS}")
+        self.system_prompt = system_prompt
+        self.model = model
+        self.token_budget = token_budget or MODEL_TOKEN_BUDGETS.get(model, DEFAULT_TOKEN_BUDGET)
+        self.layout = layout
+        # Callers holding a registry prompt pass its precomputed count
+        self.system_tokens = self._count(system_prompt) if system_tokens is None else system_tokens
+        self.turns = []
+        self._first_kept = 0
+
+        # Token accounting for the most recent `build()`
+        self.last_input_tokens = 0
+        self.last_saved_tokens = 0
+        self.total_saved_tokens = 0
+
+    def _count(self, text: str) -> int:
+        return count_tokens(text, self.model)
+
+    def add_user(self, message: str, context: str = ''):
+        """Start a new turn with the student's message and its retrieved context.
+
+        Only the latest turn is sent with its context, so the previous turn's
+        is dropped here (its `context_tokens` stay for the savings stats).
+        """
+        if self.turns:
+            self.turns[-1].pop('context', None)
+        self.turns.append({
+            'message': message,
+            'context': context,
+            'output': [],
+            'tokens': self._count(message),
+            'context_tokens': self._count(with_context(message, context)) - self._count(message),
+        })
+
+    def add_output(self, items: list):
+        """Record the model's output items (or assistant messages) for the current turn."""
+        turn = self.turns[-1]
+        turn['output'].extend(items)
+        turn['tokens'] += sum(self._count(_item_text(item)) for item in items)
+
+    def build(self) -> list:
+        """Return the input items for the next request, within the token budget."""
+        system_tokens = self.system_tokens
+        latest = self.turns[-1]
+        fixed = system_tokens + latest['tokens'] + latest['context_tokens']
+        older = self.turns[self._first_kept:-1]
+        used = fixed + sum(turn['tokens'] for turn in older)
+
+        if used > self.token_budget:
+            # Drop a chunk of old turns at once so the kept prefix stays stable
+            target = self.token_budget * COMPACT_TARGET
+            while older and used > target:
+                used -= older.pop(0)['tokens']
+                self._first_kept += 1
+
+        items = []
+        if self.system_prompt:
+            items.append({'role': 'system', 'content': self.system_prompt})
+        for turn in older:
+            items.append({'role': 'user', 'content': turn['message']})
+            items.extend(turn['output'])
+        if self.layout == 'prefix':
+            if latest['context']:
+                items.append({'role': 'developer', 'content': f"Context from textbook:\n{latest['context']}"})
+            items.append({'role': 'user', 'content': latest['message']})
+        else:
+            items.append({'role': 'user', 'content': with_context(latest['message'], latest['context'])})
+        items.extend(latest['output'])
+
+        # Compare against sending every turn with its original context
+        full = system_tokens + sum(turn['tokens'] + turn['context_tokens'] for turn in self.turns)
+        self.last_input_tokens = used
+        self.last_saved_tokens = full - used
+        self.total_saved_tokens += self.last_saved_tokens
+        return items
+
+    def transcript(self) -> list:
+        """Every turn as chat messages ({'role', 'content'}), for redisplay."""
+        messages = []
+        for turn in self.turns:
+            messages.append({'role': 'user', 'content': turn['message']})
+            text = ''.join(output_text(item) for item in turn['output'])
+            if text:
+                messages.append({'role': 'assistant', 'content': text})
+        return messages
+
+    def to_state(self) -> dict:
+        """JSON-serializable turns and trimming position (see `load_state`)."""
+        return {
+            'turns': [dict(turn, output=[_item_state(item) for item in turn['output']]) for turn in self.turns],
+            'first_kept': self._first_kept,
+            'total_saved_tokens': self.total_saved_tokens,
+        }
+
+    def load_state(self, state: dict):
+        """Restore turns saved by `to_state`."""
+        self.turns = [dict(turn) for turn in state['turns']]
+        for turn in self.turns[:-1]:
+            turn.pop('context', None)
+        self._first_kept = state['first_kept']
+        self.total_saved_tokens = state['total_saved_tokens']
+
+    def stats(self) -> dict:
+        return {
+            'turns': len(self.turns),
+            'token_budget': self.token_budget,
+            'last_input_tokens': self.last_input_tokens,
+            'last_saved_tokens': self.last_saved_tokens,
+            'total_saved_tokens': self.total_saved_tokens,
+        }
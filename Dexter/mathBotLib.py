@@ -1,110 +1,34 @@
 # Before running this script:
-# pip install gradio openai
+# pip install gradio openai chromadb
 
 import argparse
 import asyncio
+import inspect
+import time
+import weakref
 from pathlib import Path
 from typing import Optional
 
 import gradio as gr
-from openai import AsyncOpenAI
-
-from usage import print_usage, format_usage_markdown
-from chroma_db import query_textbook
-
-
-class ChatAgent:
-    def __init__(
-        self,
-        model: str,
-        prompt: str,
-        show_reasoning: bool,
-        reasoning_effort: str | None,
-        collection_name: Optional[str] = None,
-        chapter: Optional[str] = None,
-        db_path: Optional[str] = None,
-        top_k: int = 3
-    ):
-        self._ai = AsyncOpenAI()
-        self.model = model
-        self.show_reasoning = show_reasoning
-        self.reasoning = {}
-        if show_reasoning:
-            self.reasoning['summary'] = 'auto'
-        if 'gpt-5' in self.model and reasoning_effort:
-            self.reasoning['effort'] = reasoning_effort
-
-        self.usage = []
-        self.usage_markdown = format_usage_markdown(self.model, [])
-
-        # Database parameters
-        self.collection_name = collection_name
-        self.chapter = chapter
-        self.db_path = db_path
-        self.top_k = top_k
-        self.use_rag = collection_name is not None
-
-        self._history = []
-        self._prompt = prompt
-        if prompt:
-            self._history.append({'role': 'system', 'content': prompt})
-
-    def _augment_with_rag(self, user_message: str) -> str:
-        """Query the textbook database and augment the message with relevant context."""
-        if not self.use_rag:
-            return user_message
-        
-        try:
-            results = query_textbook(
-                collection_name=self.collection_name,
-                query_text=user_message,
-                chapter=self.chapter,
-                top_k=self.top_k,
-                persist_dir=self.db_path
-            )
-            
-            # Build context from results
-            context_parts = []
-            if results['documents'] and results['documents'][0]:
-                context_parts.append("Relevant textbook content:")
-                context_parts.append("-" * 50)
-                for doc, metadata in zip(results['documents'][0], results['metadatas'][0]):
-                    context_parts.append(f"[{metadata.get('section', 'Unknown')} - {metadata.get('subsection', 'Unknown')}]")
-                    context_parts.append(doc)
-                    context_parts.append("-" * 50)
-                
-                context = "\n".join(context_parts)
-                augmented_message = f"{user_message}\n\nContext from textbook:\n{context}"
-                return augmented_message
-        except Exception as e:
-            print(f"Warning: Failed to query database: {e}")
-        
-        return user_message
-
-    async def get_response(self, user_message: str):
-        # Augment user message with textbook context if RAG is enabled
-        augmented_message = self._augment_with_rag(user_message)
-        self._history.append({'role': 'user', 'content': augmented_message})
-
-        stream = self._ai.responses.stream(
-            input=self._history,
-            model=self.model,
-            reasoning=self.reasoning,
-        )
-        async with stream as stream:
-            async for event in stream:
-                if event.type == "response.output_text.delta":
-                    yield 'output', event.delta
-
-                if event.type == "response.reasoning_summary_text.delta":
-                    yield 'reasoning', event.delta
-
-            response = await stream.get_final_response()
-            self.usage.append(response.usage)
-            self.usage_markdown = format_usage_markdown(self.model, self.usage)
-            self._history.extend(
-                response.output
-            )
+
+from usage import print_usage
+from chat_engine import DEFAULT_CONTEXT_TOKENS, ChatEngine, load_prompt
+from mathjax import LOCAL_MATHJAX, gradio_fallback_url, mathjax_head
+from metrics import enable_json_logs, start_metrics_server
+from openai_clients import aclose_clients, close_clients
+from response_cache import SemanticResponseCache
+from session_store import DEFAULT_IDLE_TIMEOUT, DEFAULT_STORE_PATH, SessionStore
+
+
+# Chatbot history as {'role', 'content'} messages (the only format in Gradio 6,
+# opt-in via `type` in Gradio 5)
+MESSAGES_FORMAT = {'type': 'messages'} if 'type' in inspect.signature(gr.Chatbot.__init__).parameters else {}
+
+
+class ChatAgent(ChatEngine):
+    """Console/Gradio front end on the shared `ChatEngine`."""
+
+    frontend = 'mathbot'
 
     def __enter__(self):
         return self
@@ -136,9 +60,80 @@ async def _main_console(agent_args):
                 print(text, end='', flush=True)
             print()
             print()
+    await aclose_clients()
+
+
+# Streamed deltas are coalesced into frames: one every FRAME_INTERVAL seconds,
+# or sooner once FRAME_CHARS new characters are waiting
+FRAME_INTERVAL = 0.1
+FRAME_CHARS = 400
 
 
-def _main_gradio(agent_args):
+async def _gradio_stream(message, chat_view_history, agent, frame_interval=FRAME_INTERVAL, frame_chars=FRAME_CHARS):
+    """ChatInterface callback: yield (output, reasoning, usage, agent) frames.
+
+    The first reasoning and first output deltas are sent at once; later ones are batched on the time/size
+    window, and pending text is flushed when the window closes even if the
+    model pauses. Components unchanged since the last frame are sent as a
+    no-op `gr.update()`, and the agent state only with the final frame.
+    Gradio turns each growing string into an append-only diff on the wire.
+    """
+    output = ""
+    reasoning = ""
+    sent = {'output': None, 'reasoning': None, 'usage': None}
+    pending = 0
+    last_frame = -float('inf')
+
+    def frame(final=False):
+        nonlocal pending, last_frame
+        values = {'output': output, 'reasoning': reasoning, 'usage': agent.usage_markdown}
+        updates = {key: gr.update() if sent[key] == value else value for key, value in values.items()}
+        sent.update(values)
+        pending = 0
+        last_frame = time.monotonic()
+        # ChatInterface needs the message itself as a string
+        return output, updates['reasoning'], updates['usage'], agent if final else gr.update()
+
+    deltas = agent.get_response(message).__aiter__()
+    next_delta = asyncio.ensure_future(anext(deltas))
+    try:
+        while True:
+            timeout = max(0.0, last_frame + frame_interval - time.monotonic()) if pending else None
+            done, _ = await asyncio.wait({next_delta}, timeout=timeout)
+            if not done:
+                yield frame()
+                continue
+            try:
+                text_type, text = next_delta.result()
+            except StopAsyncIteration:
+                break
+            next_delta = asyncio.ensure_future(anext(deltas))
+
+            if text_type == 'reasoning':
+                reasoning += text
+            elif text_type == 'output':
+                output += text
+            else:
+                raise NotImplementedError(text_type)
+            pending += len(text)
+
+            first_output = text_type == 'output' and not sent['output']
+            if first_output or pending >= frame_chars or time.monotonic() - last_frame >= frame_interval:
+                yield frame()
+    finally:
+        # Stopped early (e.g. the user pressed stop): end the model stream too
+        if not next_delta.done():
+            next_delta.cancel()
+            try:
+                await next_delta
+            except (asyncio.CancelledError, StopAsyncIteration):
+                pass
+        await deltas.aclose()
+
+    yield frame(final=True)
+
+
+def _main_gradio(agent_args, store: SessionStore, frame_interval=FRAME_INTERVAL, frame_chars=FRAME_CHARS):
     # Constrain width with CSS and center
     css = """
     /* limit overall Gradio app width and center it */
@@ -159,50 +154,39 @@ def _main_gradio(agent_args):
     reasoning_view = gr.Markdown('', elem_id='reasoning-md')
     usage_view = gr.Markdown('')
 
-    mathjax_script = """
-    <script src="https://cdn.jsdelivr.net/npm/mathjax@3/es5/tex-svg.js"></script>
-    <script>
-    MathJax = {
-      tex: {
-        inlineMath: [['$', '$'], ['\\\\(', '\\\\)']],
-        displayMath: [['$$', '$$'], ['\\\\[', '\\\\]'], ['[', ']']],
-        processEscapes: true
-      },
-      svg: {
-        fontCache: 'global'
-      },
-      startup: {
-        pageReady: async () => {
-          await MathJax.typesetPromise();
-          const observer = new MutationObserver(async (mutations) => {
-            await MathJax.typesetPromise();
-          });
-          observer.observe(document.body, { childList: true, subtree: true });
-          return MathJax.startup.defaultPageReady();
-        }
-      }
-    };
-    </script>
-    """
+    # Loads MathJax once and typesets only the messages that change
+    mathjax_script = mathjax_head(gradio_fallback_url())
+
+    # Agents are cheap: they all share the process-wide OpenAI clients
+    def new_agent():
+        return ChatAgent(**agent_args)
+
+    def open_session(session_id):
+        # The browser keeps only the id; the conversation lives in the session store
+        session_id = session_id or store.new_id()
+        agent = store.get(session_id, new_agent)
+        return session_id, agent.transcript(), agent.usage_markdown
+
+    # Tabs of one browser share the session id; their turns run one at a time
+    turn_locks = weakref.WeakValueDictionary()
+
+    async def stream(message, chat_view_history, session_id):
+        if not session_id:
+            raise gr.Error('Session is still loading, please try again.')
+        lock = turn_locks.setdefault(session_id, asyncio.Lock())
+        async with lock:
+            # SQLite reads/writes stay off the event loop shared by every session
+            agent = await asyncio.to_thread(store.get, session_id, new_agent)
+            try:
+                async for output, reasoning, usage, _ in _gradio_stream(
+                    message, chat_view_history, agent, frame_interval, frame_chars
+                ):
+                    yield output, reasoning, usage
+            finally:
+                await asyncio.to_thread(store.save, session_id, agent)
 
     with gr.Blocks(css=css, theme=gr.themes.Monochrome(), head=mathjax_script) as demo:
-        agent = gr.State()
-
-        async def get_response(message, chat_view_history, agent):
-            output = ""
-            reasoning = ""
-
-            async for text_type, text in agent.get_response(message):
-                if text_type == 'reasoning':
-                    reasoning += text
-                elif text_type == 'output':
-                    output += text
-                else:
-                    raise NotImplementedError(text_type)
-
-                yield output, reasoning, agent.usage_markdown, agent
-
-            yield output, reasoning, agent.usage_markdown, agent
+        session = gr.BrowserState(None, storage_key='mathbot_session')
 
         with gr.Row():
             with gr.Column(scale=5):
@@ -210,21 +194,35 @@ def _main_gradio(agent_args):
                     label=' ',
                     height=600,
                     resizable=True,
+                    **MESSAGES_FORMAT
                 )
                 chat = gr.ChatInterface(
                     chatbot=bot,
-                    fn=get_response,
-                    additional_inputs=[agent],
-                    additional_outputs=[reasoning_view, usage_view, agent]
+                    **MESSAGES_FORMAT,
+                    fn=stream,
+                    additional_inputs=[session],
+                    additional_outputs=[reasoning_view, usage_view]
                 )
 
             with gr.Column(scale=1):
                 reasoning_view.render()
                 usage_view.render()
 
-        demo.load(fn=lambda: ChatAgent(**agent_args), outputs=[agent])
+        demo.load(fn=open_session, inputs=[session], outputs=[session, bot, usage_view])
+        # Clearing the chat starts a new conversation
+        bot.clear(fn=store.delete, inputs=[session])
 
-    demo.launch()
+    if LOCAL_MATHJAX.exists():
+        # Lets Gradio serve the local MathJax fallback
+        launch_args = dict(allowed_paths=[str(LOCAL_MATHJAX.parent.resolve())])
+    else:
+        launch_args = {}
+        print("Warning: No local MathJax copy (run `python Dexter/mathjax.py`); math needs the CDN")
+    try:
+        demo.launch(**launch_args)
+    finally:
+        store.close()
+        close_clients()
 
 
 def main(
@@ -235,21 +233,48 @@ def main(
     use_web: bool,
     collection_name: Optional[str] = None,
     chapter: Optional[str] = None,
-    db_path: Optional[str] = None
+    db_path: Optional[str] = None,
+    top_k: int = 3,
+    rerank: bool = False,
+    context_tokens: Optional[int] = DEFAULT_CONTEXT_TOKENS,
+    response_cache: bool = False,
+    cache_threshold: float = 0.92,
+    history_budget: Optional[int] = None,
+    prompt_layout: str = 'inline',
+    metrics_port: Optional[int] = None,
+    json_logs: bool = False,
+    frame_interval: float = FRAME_INTERVAL,
+    frame_chars: int = FRAME_CHARS,
+    session_db: Path = DEFAULT_STORE_PATH,
+    idle_timeout: float = DEFAULT_IDLE_TIMEOUT
 ):
+    if metrics_port:
+        start_metrics_server(metrics_port)
+    if json_logs:
+        enable_json_logs()
+
     agent_args = dict(
         model=model,
-        prompt=prompt_path.read_text() if prompt_path else '',
+        prompt=load_prompt(prompt_path),
         show_reasoning=show_reasoning,
         reasoning_effort=reasoning_effort,
         collection_name=collection_name,
         chapter=chapter,
         db_path=db_path,
-        top_k=3
+        top_k=top_k,
+        rerank=rerank,
+        context_tokens=context_tokens,
+        history_budget=history_budget,
+        prompt_layout=prompt_layout,
+        # One cache shared by every session in the process
+        response_cache=SemanticResponseCache(
+            persist_dir=db_path,
+            similarity_threshold=cache_threshold
+        ) if response_cache else None
     )
 
     if use_web:
-        _main_gradio(agent_args)
+        _main_gradio(agent_args, SessionStore(session_db, idle_timeout), frame_interval, frame_chars)
     else:
         asyncio.run(_main_console(agent_args))
 
@@ -265,6 +290,25 @@ if __name__ == "__main__":
     parser.add_argument('--collection', default='chapter-1-functions', help='Chroma collection name for RAG')
     parser.add_argument('--chapter', default=None, help='Filter results by chapter')
     parser.add_argument('--db-path', default='./chroma_db_persistent', help='Path to Chroma database')
+    parser.add_argument('--top-k', type=int, default=3, help='Textbook passages per question')
+    parser.add_argument('--rerank', action='store_true', help='Rerank hybrid retrieval results by term overlap')
+    parser.add_argument('--context-tokens', type=int, default=DEFAULT_CONTEXT_TOKENS,
+                        help='Token budget for textbook context per turn (0: unlimited)')
+    parser.add_argument('--response-cache', action='store_true', help='Replay cached answers to near-duplicate questions')
+    parser.add_argument('--cache-threshold', type=float, default=0.92, help='Cosine similarity needed for a cache hit')
+    parser.add_argument('--history-budget', type=int, default=None, help='Token budget for conversation history')
+    parser.add_argument('--prompt-layout', choices=['inline', 'prefix'], default='inline',
+                        help="'prefix' keeps a stable prompt prefix to maximize cached input tokens")
+    parser.add_argument('--metrics-port', type=int, default=None, help='Serve Prometheus metrics on localhost:PORT/metrics')
+    parser.add_argument('--json-logs', action='store_true', help='Log one JSON line per response to stderr')
+    parser.add_argument('--frame-interval', type=float, default=FRAME_INTERVAL,
+                        help='Seconds between streamed Gradio frames')
+    parser.add_argument('--frame-chars', type=int, default=FRAME_CHARS,
+                        help='Send a Gradio frame early once this many new characters arrive')
+    parser.add_argument('--session-db', type=Path, default=DEFAULT_STORE_PATH,
+                        help='SQLite file for web chat sessions')
+    parser.add_argument('--idle-timeout', type=float, default=DEFAULT_IDLE_TIMEOUT,
+                        help='Seconds before an idle web session is paged out of memory')
     args = parser.parse_args()
     main(
         args.prompt_file,
@@ -274,5 +318,18 @@ if __name__ == "__main__":
         args.web,
         collection_name=args.collection,
         chapter=args.chapter,
-        db_path=args.db_path
+        db_path=args.db_path,
+        top_k=args.top_k,
+        rerank=args.rerank,
+        context_tokens=args.context_tokens or None,
+        response_cache=args.response_cache,
+        cache_threshold=args.cache_threshold,
+        history_budget=args.history_budget,
+        prompt_layout=args.prompt_layout,
+        metrics_port=args.metrics_port,
+        json_logs=args.json_logs,
+        frame_interval=args.frame_interval,
+        frame_chars=args.frame_chars,
+        session_db=args.session_db,
+        idle_timeout=args.idle_timeout
     )
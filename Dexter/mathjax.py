@@ -0,0 +1,200 @@
+"""
+MathJax loader shared by the Gradio bot and the Streamlit pages.
+
+MathJax is loaded once per page (from the CDN, falling back to a local copy
+if that fails) and typesets only the chat messages that changed: mutations
+mark their message node dirty, and dirty nodes are typeset after a short
+debounce. While an answer streams, a pass still runs at least every
+`max_wait_ms`. When the stream stops, the trailing debounce gives a final
+pass over the complete message. Nothing else on the page is re-typeset.
+
+The local fallback copy is not part of the repository. Fetch it once with
+
+    python Dexter/mathjax.py
+
+which saves MathJax's `es5/tex-svg.js` to `static/mathjax/tex-svg.js` next to
+this file (see `LOCAL_MATHJAX`). Without it, math stays unrendered whenever
+the CDN is unreachable.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Optional
+import json
+import urllib.request
+
+
+MATHJAX_CDN = "https://cdn.jsdelivr.net/npm/mathjax@3/es5/tex-svg.js"
+LOCAL_MATHJAX = Path(__file__).parent / "static" / "mathjax" / "tex-svg.js"
+
+# Chat message containers in Gradio's Chatbot / Markdown and Streamlit's st.chat_message
+MESSAGE_SELECTOR = '.message, .prose, [data-testid="stChatMessage"]'
+
+_CONFIG = {
+    "tex": {
+        "inlineMath": [["$", "$"], ["\\(", "\\)"]],
+        "displayMath": [["$$", "$$"], ["\\[", "\\]"], ["[", "]"]],
+        "processEscapes": True,
+    },
+    "svg": {"fontCache": "global"},
+    # Leave math Streamlit already rendered with KaTeX alone
+    "options": {"ignoreHtmlClass": "tex2jax_ignore|katex"},
+    # Typesetting is driven by the observer below, not by a full-page pass
+    "startup": {"typeset": False},
+}
+
+_SCRIPT = """
+(function (win) {
+  var doc = win.document;
+  if (win.__mathbotMathJax) { return; }
+  win.__mathbotMathJax = true;
+
+  var SELECTOR = %(selector)s, DEBOUNCE = %(debounce)d, MAX_WAIT = %(max_wait)d;
+  var dirty = new Set(), timer = null, firstDirty = 0, queue = Promise.resolve();
+
+  function flush() {
+    timer = null;
+    var nodes = Array.from(dirty).filter(function (node) { return node.isConnected; });
+    dirty.clear();
+    // Typeset outermost nodes only
+    nodes = nodes.filter(function (node) {
+      return !nodes.some(function (other) { return other !== node && other.contains(node); });
+    });
+    if (!nodes.length || !win.MathJax || !win.MathJax.typesetPromise) { return; }
+    queue = queue.then(function () {
+      win.MathJax.typesetClear(nodes);
+      return win.MathJax.typesetPromise(nodes);
+    }).catch(function (err) { console.warn('MathJax typeset failed', err); });
+  }
+
+  function mark(message) {
+    if (!dirty.size) { firstDirty = Date.now(); }
+    dirty.add(message);
+    clearTimeout(timer);
+    // Debounce while deltas arrive, but typeset at least every MAX_WAIT ms
+    timer = setTimeout(flush, Math.max(0, Math.min(DEBOUNCE, firstDirty + MAX_WAIT - Date.now())));
+  }
+
+  function messageOf(node) {
+    var element = node.nodeType === 1 ? node : node.parentElement;
+    if (!element || element.closest('mjx-container')) { return null; }
+    return element.closest(SELECTOR);
+  }
+
+  function fromMathJax(mutation) {
+    // MathJax inserting its own output
+    return Array.from(mutation.addedNodes).some(function (node) {
+      return node.nodeName.indexOf('MJX-') === 0;
+    });
+  }
+
+  function observe() {
+    new win.MutationObserver(function (mutations) {
+      mutations.forEach(function (mutation) {
+        if (fromMathJax(mutation)) { return; }
+        var message = messageOf(mutation.target);
+        if (message) {
+          mark(message);
+        } else {
+          // New messages (or containers holding them) added outside any message
+          mutation.addedNodes.forEach(function (node) {
+            if (node.nodeType !== 1) { return; }
+            if (node.matches(SELECTOR)) { mark(node); }
+            node.querySelectorAll(SELECTOR).forEach(mark);
+          });
+        }
+      });
+    }).observe(doc.body, { childList: true, subtree: true, characterData: true });
+    doc.querySelectorAll(SELECTOR).forEach(mark);
+  }
+
+  var config = %(config)s;
+  config.startup.pageReady = function () {
+    return win.MathJax.startup.defaultPageReady().then(observe);
+  };
+  win.MathJax = config;
+
+  function load(src, fallback) {
+    var script = doc.createElement('script');
+    script.src = src;
+    script.async = true;
+    if (fallback) {
+      script.onerror = function () { script.remove(); load(fallback, null); };
+    }
+    doc.head.appendChild(script);
+  }
+  load(%(cdn)s, %(fallback)s);
+})(%(target)s);
+"""
+
+
+def mathjax_script(
+    target: str = "window",
+    fallback_url: Optional[str] = None,
+    message_selector: str = MESSAGE_SELECTOR,
+    debounce_ms: int = 150,
+    max_wait_ms: int = 600
+) -> str:
+    """JavaScript that loads MathJax into `target` (a window expression) and
+    typesets changed messages incrementally. Safe to run more than once."""
+    return _SCRIPT % dict(
+        target=target,
+        selector=json.dumps(message_selector),
+        debounce=debounce_ms,
+        max_wait=max_wait_ms,
+        config=json.dumps(_CONFIG),
+        cdn=json.dumps(MATHJAX_CDN),
+        fallback=json.dumps(fallback_url),
+    )
+
+
+def mathjax_head(fallback_url: Optional[str] = None) -> str:
+    """`<script>` block for a page's head (Gradio `Blocks(head=...)`)."""
+    return f"<script>{mathjax_script('window', fallback_url)}</script>"
+
+
+def mathjax_component(fallback_url: Optional[str] = None) -> str:
+    """HTML for a zero-height Streamlit component that loads MathJax into the
+    app page once per browser tab.
+
+    The script is copied into the parent document rather than run from the
+    component's iframe, so it keeps working after Streamlit replaces the
+    iframe on a rerun or page switch.
+    """
+    code = json.dumps(mathjax_script("window", fallback_url))
+    return (
+        "<script>\n"
+        "var doc = window.parent.document;\n"
+        "if (!doc.getElementById('mathbot-mathjax')) {\n"
+        "  var script = doc.createElement('script');\n"
+        "  script.id = 'mathbot-mathjax';\n"
+        f"  script.text = {code};\n"
+        "  doc.head.appendChild(script);\n"
+        "}\n"
+        "</script>"
+    )
+
+
+def gradio_fallback_url() -> Optional[str]:
+    """URL Gradio serves the local MathJax copy at (None if there is no copy).
+
+    The copy's directory must be in `launch(allowed_paths=...)`.
+    """
+    if not LOCAL_MATHJAX.exists():
+        return None
+    return f"/gradio_api/file={LOCAL_MATHJAX.resolve().as_posix()}"
+
+
+def fetch_local_copy(url: str = MATHJAX_CDN, dest: Path = LOCAL_MATHJAX) -> Path:
+    """Download MathJax to `dest` for the local fallback."""
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_suffix(".tmp")
+    with urllib.request.urlopen(url, timeout=60) as response:
+        tmp.write_bytes(response.read())
+    tmp.replace(dest)
+    return dest
+
+
+if __name__ == "__main__":
+    print(f"Saved MathJax to {fetch_local_copy()}")
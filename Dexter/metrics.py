@@ -0,0 +1,201 @@
+"""
+In-process metrics for latency, tokens and cost.
+
+Histograms and counters are kept in memory and exposed in the Prometheus
+text format on a local `/metrics` endpoint (`start_metrics_server`). Each
+chat response is also logged as one JSON line on the `metrics` logger once
+`enable_json_logs` has been called.
+"""
+
+from __future__ import annotations
+
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+import bisect
+import json
+import logging
+import sys
+import threading
+import time
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+logger = logging.getLogger('metrics')
+
+
+def _label_text(labels: tuple, extra: str = '') -> str:
+    parts = [f'{key}="{value}"' for key, value in labels]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(sorted(labels.items())), 0.0)
+
+    def render(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_label_text(labels)} {value}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0}
+            series['counts'][bisect.bisect_left(self.buckets, value)] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the `with` block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for labels, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ('+Inf',), series['counts']):
+                    cumulative += count
+                    le = f'le="{bound}"'
+                    lines.append(f'{self.name}_bucket{_label_text(labels, le)} {cumulative}')
+                lines.append(f'{self.name}_sum{_label_text(labels)} {series["sum"]}')
+                lines.append(f'{self.name}_count{_label_text(labels)} {series["count"]}')
+        return lines
+
+
+TIME_TO_FIRST_TOKEN = Histogram('chat_time_to_first_token_seconds', 'Time from user message to first output token')
+RESPONSE_TIME = Histogram('chat_response_seconds', 'Total time to stream a response')
+RETRIEVAL_TIME = Histogram('rag_retrieval_seconds', 'Textbook retrieval latency (embedding + vector search)')
+CHROMA_QUERY_TIME = Histogram('chroma_query_seconds', 'Chroma vector search latency')
+EMBEDDING_TIME = Histogram('embedding_request_seconds', 'Embedding API request latency')
+TOKENS = Counter('chat_tokens_total', 'Tokens used, by model and kind')
+COST = Counter('chat_cost_usd_total', 'Estimated spend in USD, by model (see usage.PRICING)')
+RESPONSES = Counter('chat_responses_total', 'Responses served, by model, front end and source')
+QUERY_FLIGHTS = Counter('rag_query_flights_total', 'Textbook queries by single-flight outcome (hit, coalesced, miss)')
+
+REGISTRY = [
+    TIME_TO_FIRST_TOKEN, RESPONSE_TIME, RETRIEVAL_TIME, CHROMA_QUERY_TIME,
+    EMBEDDING_TIME, TOKENS, COST, RESPONSES, QUERY_FLIGHTS,
+]
+
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def log_event(event: str, **fields):
+    """Log one structured event (a JSON line once `enable_json_logs` is on)."""
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps({'event': event, 'ts': time.time(), **fields}, default=str))
+
+
+def enable_json_logs(stream=sys.stderr):
+    """Write metric events as JSON lines to `stream`."""
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = render_metrics().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TurnTimer:
+    """Times one chat turn: retrieval, first output token and total duration."""
+
+    def __init__(self, model: str, frontend: str):
+        self.model = model
+        self.frontend = frontend
+        self.start = time.perf_counter()
+        self.retrieval = None
+        self.first_token = None
+
+    def retrieved(self):
+        self.retrieval = time.perf_counter() - self.start
+
+    def delta(self, kind: str):
+        if kind == 'output' and self.first_token is None:
+            self.first_token = time.perf_counter() - self.start
+
+    def finish(self, source: str, tokens: Optional[dict] = None, cost: float = 0.0):
+        """Record the turn; `source` is 'model' or 'cache'."""
+        total = time.perf_counter() - self.start
+        labels = dict(model=self.model, frontend=self.frontend)
+        if self.first_token is not None:
+            TIME_TO_FIRST_TOKEN.observe(self.first_token, **labels)
+        RESPONSE_TIME.observe(total, **labels)
+        RESPONSES.inc(source=source, **labels)
+        if tokens:
+            for kind, count in tokens.items():
+                TOKENS.inc(count, model=self.model, kind=kind)
+            COST.inc(cost, model=self.model)
+        log_event(
+            'chat_response', source=source, retrieval_seconds=self.retrieval,
+            ttft_seconds=self.first_token, total_seconds=total,
+            tokens=tokens or {}, cost_usd=cost, **labels
+        )
+
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: int = 9464, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+    """Serve `/metrics` from a daemon thread (idempotent within a process)."""
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            threading.Thread(target=_server.serve_forever, name='metrics', daemon=True).start()
+        return _server
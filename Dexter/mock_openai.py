@@ -0,0 +1,315 @@
+"""
+Local stand-in for the OpenAI API, for offline benchmarks and demos.
+
+Serves the Responses, Chat Completions and Embeddings endpoints (streaming
+and non-streaming) with a configurable first-token delay and token rate.
+Embeddings are deterministic unit vectors derived from the text hash, so
+repeated runs retrieve the same passages.
+
+Point any OpenAI client at it with `OPENAI_BASE_URL`:
+
+    python mock_openai.py --port 8800 --tokens-per-second 40
+    OPENAI_BASE_URL=http://127.0.0.1:8800/v1 OPENAI_API_KEY=mock python mathBotLib.py
+"""
+
+from __future__ import annotations
+
+from array import array
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import base64
+import hashlib
+import itertools
+import json
+import random
+import threading
+import time
+
+from tokens import count_tokens
+
+
+DEFAULT_REPLY = (
+    "Let's work through it step by step. A function assigns exactly one output to each input, "
+    "so for $f(x) = 2x + 3$ we substitute the input for $x$: $f(4) = 2 \\cdot 4 + 3 = 11$. "
+    "The domain is every input we may use and the range is every output we get back. "
+    "Try $f(-1)$ yourself and tell me what you find."
+)
+
+_ids = itertools.count(1)
+
+
+def fake_embedding(text: str, dimensions: int = 1536) -> list[float]:
+    """Deterministic unit vector for `text`."""
+    rng = random.Random(hashlib.sha256(text.encode("utf-8")).digest())
+    vector = [rng.gauss(0.0, 1.0) for _ in range(dimensions)]
+    norm = sum(x * x for x in vector) ** 0.5
+    return [x / norm for x in vector]
+
+
+def _input_text(value) -> str:
+    """Flatten a Responses `input` / Chat Completions `messages` payload to text."""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, list):
+        return "\n".join(_input_text(item) for item in value)
+    if isinstance(value, dict):
+        return _input_text(value.get("content") or value.get("text") or "")
+    return ""
+
+
+class MockOpenAIServer:
+    """Threaded HTTP server imitating the OpenAI endpoints used by the bots."""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        tokens_per_second: float = 50.0,
+        first_token_delay: float = 0.3,
+        reply: str = DEFAULT_REPLY,
+        embedding_delay: float = 0.02,
+        embedding_dimensions: int = 1536
+    ):
+        self.tokens_per_second = tokens_per_second
+        self.first_token_delay = first_token_delay
+        self.reply = reply
+        self.embedding_delay = embedding_delay
+        self.embedding_dimensions = embedding_dimensions
+        self.requests = 0
+
+        handler = type("Handler", (_Handler,), {"mock": self})
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "MockOpenAIServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-openai", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def reply_tokens(self) -> list[str]:
+        # Whitespace-led word pieces, roughly one model token each
+        return [word if i == 0 else " " + word for i, word in enumerate(self.reply.split(" "))]
+
+    def stream_tokens(self):
+        """Yield reply tokens at the configured first-token delay and rate."""
+        time.sleep(self.first_token_delay)
+        interval = 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+        for i, token in enumerate(self.reply_tokens()):
+            if i and interval:
+                time.sleep(interval)
+            yield token
+
+
+class _Handler(BaseHTTPRequestHandler):
+    mock: MockOpenAIServer
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        self.mock.requests += 1
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        path = self.path.split("?")[0].rstrip("/")
+
+        try:
+            if path.endswith("/embeddings"):
+                self._embeddings(body)
+            elif path.endswith("/responses"):
+                self._responses(body)
+            elif path.endswith("/chat/completions"):
+                self._chat_completions(body)
+            else:
+                self._send_json({"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}}, 404)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading a stream early
+            self.close_connection = True
+
+    # Transport
+
+    def _send_json(self, payload: dict, status: int = 200):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _start_events(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+    def _send_event(self, payload: dict, event: str | None = None):
+        lines = f"event: {event}\n" if event else ""
+        self.wfile.write(f"{lines}data: {json.dumps(payload)}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+    # Endpoints
+
+    def _embeddings(self, body: dict):
+        texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        time.sleep(self.mock.embedding_delay)
+        dimensions = body.get("dimensions") or self.mock.embedding_dimensions
+        data = []
+        for index, text in enumerate(texts):
+            vector = fake_embedding(str(text), dimensions)
+            if body.get("encoding_format") == "base64":
+                vector = base64.b64encode(array("f", vector).tobytes()).decode("ascii")
+            data.append({"object": "embedding", "index": index, "embedding": vector})
+        tokens = sum(count_tokens(str(text)) for text in texts)
+        self._send_json({
+            "object": "list",
+            "data": data,
+            "model": body.get("model", "text-embedding-3-small"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        })
+
+    def _responses(self, body: dict):
+        response_id = f"resp_mock{next(_ids)}"
+        item_id = f"msg_mock{next(_ids)}"
+        model = body.get("model", "gpt-4.1-nano")
+        input_tokens = count_tokens(_input_text(body.get("input")))
+
+        def response(status, output, usage=None):
+            return {
+                "id": response_id, "object": "response", "created_at": int(time.time()),
+                "status": status, "model": model, "output": output, "usage": usage,
+                "parallel_tool_calls": True, "tool_choice": "auto", "tools": [],
+            }
+
+        def message(text, status):
+            content = [{"type": "output_text", "text": text, "annotations": []}] if text is not None else []
+            return {"id": item_id, "type": "message", "role": "assistant", "status": status, "content": content}
+
+        def usage(output_tokens):
+            return {
+                "input_tokens": input_tokens,
+                "input_tokens_details": {"cached_tokens": 0},
+                "output_tokens": output_tokens,
+                "output_tokens_details": {"reasoning_tokens": 0},
+                "total_tokens": input_tokens + output_tokens,
+            }
+
+        if not body.get("stream"):
+            tokens = list(self.mock.stream_tokens())
+            text = "".join(tokens)
+            self._send_json(response("completed", [message(text, "completed")], usage(len(tokens))))
+            return
+
+        sequence = itertools.count()
+
+        def send(event_type, **fields):
+            self._send_event({"type": event_type, "sequence_number": next(sequence), **fields}, event_type)
+
+        self._start_events()
+        send("response.created", response=response("in_progress", []))
+        send("response.in_progress", response=response("in_progress", []))
+        send("response.output_item.added", output_index=0, item=message(None, "in_progress"))
+        send("response.content_part.added", item_id=item_id, output_index=0, content_index=0,
+             part={"type": "output_text", "text": "", "annotations": []})
+
+        tokens = []
+        for token in self.mock.stream_tokens():
+            tokens.append(token)
+            send("response.output_text.delta", item_id=item_id, output_index=0, content_index=0,
+                 delta=token, logprobs=[])
+
+        text = "".join(tokens)
+        send("response.output_text.done", item_id=item_id, output_index=0, content_index=0,
+             text=text, logprobs=[])
+        send("response.content_part.done", item_id=item_id, output_index=0, content_index=0,
+             part={"type": "output_text", "text": text, "annotations": []})
+        send("response.output_item.done", output_index=0, item=message(text, "completed"))
+        send("response.completed", response=response("completed", [message(text, "completed")], usage(len(tokens))))
+
+    def _chat_completions(self, body: dict):
+        completion_id = f"chatcmpl-mock{next(_ids)}"
+        model = body.get("model", "gpt-4.1-nano")
+        created = int(time.time())
+        prompt_tokens = count_tokens(_input_text(body.get("messages")))
+
+        def usage(completion_tokens):
+            return {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            }
+
+        if not body.get("stream"):
+            tokens = list(self.mock.stream_tokens())
+            self._send_json({
+                "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{
+                    "index": 0, "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": "".join(tokens)},
+                }],
+                "usage": usage(len(tokens)),
+            })
+            return
+
+        def chunk(delta, finish_reason=None, usage=None):
+            payload = {
+                "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            if usage is not None:
+                payload["usage"] = usage
+            return payload
+
+        self._start_events()
+        self._send_event(chunk({"role": "assistant", "content": ""}))
+        count = 0
+        for token in self.mock.stream_tokens():
+            count += 1
+            self._send_event(chunk({"content": token}))
+        self._send_event(chunk({}, "stop"))
+        if (body.get("stream_options") or {}).get("include_usage"):
+            final = chunk({}, usage=usage(count))
+            final["choices"] = []
+            self._send_event(final)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser("mock_openai")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--first-token-delay", type=float, default=0.3, help="Seconds before the first token")
+    parser.add_argument("--embedding-delay", type=float, default=0.02)
+    args = parser.parse_args()
+
+    server = MockOpenAIServer(
+        args.host,
+        args.port,
+        tokens_per_second=args.tokens_per_second,
+        first_token_delay=args.first_token_delay,
+        embedding_delay=args.embedding_delay
+    )
+    print(f"Mock OpenAI API on {server.base_url} (Ctrl+C to stop)")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,133 @@
+"""
+Process-wide OpenAI clients with tuned connection pools.
+
+Chat sessions, textbook retrieval and the caches share one sync client and
+one async client per (API key, base URL) instead of each opening its own
+httpx pool, so a new session starts on warm keep-alive connections. Async
+clients are kept per event loop, since httpx connections cannot move
+between loops (Gradio serves every session from one loop).
+
+HTTP/2 multiplexes concurrent streams over a few connections. It needs the
+`h2` package (`httpx[http2]` in requirements.txt); without it the clients
+fall back to HTTP/1.1 and say so once. Pool sizes can be tuned with `OPENAI_MAX_CONNECTIONS`,
+`OPENAI_MAX_KEEPALIVE` and `OPENAI_KEEPALIVE_EXPIRY`; `OPENAI_HTTP2=0`
+turns HTTP/2 off.
+"""
+
+from __future__ import annotations
+
+from typing import Optional
+import asyncio
+import atexit
+import importlib.util
+import os
+import threading
+import weakref
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
+
+
+_lock = threading.Lock()
+_clients = {}  # (api key, base url) -> OpenAI
+_async_clients = weakref.WeakKeyDictionary()  # event loop -> {(api key, base url): AsyncOpenAI}
+_atexit_registered = False
+_http2_warned = False
+
+
+def http2_enabled() -> bool:
+    """HTTP/2 if `h2` is importable and not disabled via `OPENAI_HTTP2=0`."""
+    global _http2_warned
+    if os.environ.get("OPENAI_HTTP2", "1") == "0":
+        return False
+    if importlib.util.find_spec("h2") is None:
+        if not _http2_warned:
+            print("Warning: `h2` is not installed, OpenAI clients use HTTP/1.1 (pip install 'httpx[http2]')")
+            _http2_warned = True
+        return False
+    return True
+
+
+def connection_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=int(os.environ.get("OPENAI_MAX_CONNECTIONS", "100")),
+        max_keepalive_connections=int(os.environ.get("OPENAI_MAX_KEEPALIVE", "20")),
+        keepalive_expiry=float(os.environ.get("OPENAI_KEEPALIVE_EXPIRY", "30")),
+    )
+
+
+def _key(api_key: Optional[str]) -> tuple:
+    # Resolved on every call so a changed OPENAI_BASE_URL gets its own client
+    return (api_key or os.environ.get("OPENAI_API_KEY"), os.environ.get("OPENAI_BASE_URL"))
+
+
+def _register_shutdown():
+    global _atexit_registered
+    if not _atexit_registered:
+        atexit.register(close_clients)
+        _atexit_registered = True
+
+
+def get_client(api_key: Optional[str] = None) -> OpenAI:
+    """Shared sync client for `api_key` (default: `OPENAI_API_KEY`)."""
+    key = _key(api_key)
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = OpenAI(
+                api_key=key[0],
+                base_url=key[1],
+                http_client=DefaultHttpxClient(limits=connection_limits(), http2=http2_enabled())
+            )
+            _register_shutdown()
+        return client
+
+
+def get_async_client(api_key: Optional[str] = None) -> AsyncOpenAI:
+    """Shared async client for `api_key` on the running event loop (call from async code)."""
+    key = _key(api_key)
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _async_clients.setdefault(loop, {})
+        client = clients.get(key)
+        if client is None:
+            client = clients[key] = AsyncOpenAI(
+                api_key=key[0],
+                base_url=key[1],
+                http_client=DefaultAsyncHttpxClient(limits=connection_limits(), http2=http2_enabled())
+            )
+            _register_shutdown()
+        return client
+
+
+async def aclose_clients():
+    """Close the running loop's async clients (call before the loop exits)."""
+    with _lock:
+        clients = _async_clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        await client.close()
+
+
+def close_clients(timeout: float = 5.0):
+    """Close every shared client; registered with `atexit` on first use.
+
+    Async clients on a loop that is still running in another thread (e.g.
+    Gradio's) are closed on that loop; those of finished loops were torn
+    down with them and are just dropped.
+    """
+    with _lock:
+        clients = list(_clients.values())
+        _clients.clear()
+        async_clients = [(loop, list(by_key.values())) for loop, by_key in _async_clients.items()]
+        _async_clients.clear()
+
+    for client in clients:
+        client.close()
+    for loop, loop_clients in async_clients:
+        if not loop.is_running() or loop.is_closed():
+            continue
+        for client in loop_clients:
+            try:
+                asyncio.run_coroutine_threadsafe(client.close(), loop).result(timeout)
+            except Exception as e:
+                print(f"Warning: Failed to close OpenAI client: {e}")
@@ -0,0 +1,65 @@
+"""
+Process-wide registry of system prompts.
+
+Each prompt file is read once, together with its sha256 and token count, and
+only re-read when its mtime changes (checked at most every `check_interval`
+seconds). Streamlit reruns and new Gradio sessions therefore skip file I/O,
+and the hash can serve as a cache key for response and prefix caches.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import NamedTuple
+import os
+import threading
+import time
+
+from hashing import text_hash
+from tokens import count_tokens
+
+
+class LoadedPrompt(NamedTuple):
+    path: str
+    text: str
+    sha256: str
+    token_count: int
+    mtime: float
+
+
+class PromptRegistry:
+    def __init__(self, check_interval: float = 1.0):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._prompts = {}
+        self._checked = {}
+
+    def get(self, prompt_path) -> LoadedPrompt:
+        """Return the prompt at `prompt_path`, reloading it if the file changed."""
+        path = os.path.abspath(prompt_path)
+        now = time.monotonic()
+        with self._lock:
+            prompt = self._prompts.get(path)
+            if prompt is not None and now - self._checked[path] < self.check_interval:
+                return prompt
+
+            mtime = os.stat(path).st_mtime
+            if prompt is None or prompt.mtime != mtime:
+                text = Path(path).read_text(encoding='utf-8')
+                prompt = LoadedPrompt(path, text, text_hash(text), count_tokens(text), mtime)
+                self._prompts[path] = prompt
+            self._checked[path] = now
+            return prompt
+
+    def clear(self):
+        with self._lock:
+            self._prompts.clear()
+            self._checked.clear()
+
+
+_registry = PromptRegistry()
+
+
+def get_prompt(prompt_path) -> LoadedPrompt:
+    """Load `prompt_path` through the process-wide registry."""
+    return _registry.get(prompt_path)
@@ -0,0 +1,129 @@
+"""
+Opt-in semantic cache for chat responses.
+
+Incoming questions are embedded and matched against previously answered
+questions in a dedicated Chroma collection. A match above the similarity
+threshold, under the same cache key (model + system prompt + RAG context),
+is replayed instead of calling the model.
+"""
+
+from __future__ import annotations
+
+from typing import Optional
+import time
+
+from chroma_db import aembed_texts, embed_texts, get_pool, run_in_executor
+from hashing import text_hash
+
+
+class SemanticResponseCache:
+    def __init__(
+        self,
+        collection_name: str = "response-cache",
+        persist_dir: Optional[str] = None,
+        similarity_threshold: float = 0.92,
+        ttl_seconds: float = 7 * 24 * 3600,
+        max_entries: int = 5000,
+        embedding_model: str = "text-embedding-3-small"
+    ):
+        self.collection_name = collection_name
+        self.persist_dir = persist_dir
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.embedding_model = embedding_model
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(model: str, prompt_hash: str, context: str) -> str:
+        """Cache key: answers are only reused for the same model, prompt (by hash) and context."""
+        return text_hash("\x1f".join([model, prompt_hash, text_hash(context or "")]))
+
+    def _collection(self):
+        return get_pool().get_collection(
+            self.collection_name,
+            self.persist_dir,
+            self.embedding_model,
+            metadata={"hnsw:space": "cosine"}
+        )
+
+    def _lookup(self, embedding: list[float], key: str) -> Optional[str]:
+        collection = self._collection()
+        results = collection.query(
+            query_embeddings=[embedding],
+            n_results=1,
+            where={"key": key},
+            include=["metadatas", "distances"]
+        )
+
+        if results["ids"] and results["ids"][0]:
+            entry_id = results["ids"][0][0]
+            metadata = results["metadatas"][0][0]
+            similarity = 1.0 - results["distances"][0][0]
+            now = time.time()
+            if now - metadata["created_at"] > self.ttl_seconds:
+                collection.delete(ids=[entry_id])
+            elif similarity >= self.similarity_threshold:
+                self.hits += 1
+                collection.update(ids=[entry_id], metadatas=[{**metadata, "last_hit": now}])
+                return metadata["answer"]
+
+        self.misses += 1
+        return None
+
+    def _store(self, question: str, embedding: list[float], key: str, answer: str):
+        collection = self._collection()
+        now = time.time()
+        collection.upsert(
+            ids=[text_hash(key + question.strip().lower())[:24]],
+            embeddings=[embedding],
+            documents=[question],
+            metadatas=[{"key": key, "answer": answer, "created_at": now, "last_hit": now}]
+        )
+        self.stores += 1
+
+        # Evict in chunks so the full scan only runs once per ~10% overflow
+        count = collection.count()
+        if count > self.max_entries * 1.1:
+            entries = collection.get(include=["metadatas"])
+            by_last_hit = sorted(
+                zip(entries["ids"], entries["metadatas"]),
+                key=lambda entry: entry[1]["last_hit"]
+            )
+            stale = [entry_id for entry_id, _ in by_last_hit[:count - self.max_entries]]
+            collection.delete(ids=stale)
+            self.evictions += len(stale)
+
+    def lookup(self, question: str, key: str, client=None) -> Optional[str]:
+        """Return the cached answer for a near-duplicate question, or None."""
+        (embedding,) = embed_texts([question], self.embedding_model, client)
+        return self._lookup(embedding, key)
+
+    def store(self, question: str, key: str, answer: str, client=None):
+        """Cache `answer` for `question` and evict least-recently-used entries over the limit."""
+        (embedding,) = embed_texts([question], self.embedding_model, client)
+        self._store(question, embedding, key, answer)
+
+    async def alookup(self, question: str, key: str, client=None) -> Optional[str]:
+        """Async version of `lookup`; Chroma work runs off the event loop."""
+        (embedding,) = await aembed_texts([question], self.embedding_model, client)
+        return await run_in_executor(self._lookup, embedding, key)
+
+    async def astore(self, question: str, key: str, answer: str, client=None):
+        """Async version of `store`."""
+        (embedding,) = await aembed_texts([question], self.embedding_model, client)
+        await run_in_executor(self._store, question, embedding, key, answer)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'stores': self.stores,
+            'evictions': self.evictions,
+        }
@@ -0,0 +1,161 @@
+"""
+SQLite-backed chat session store with idle eviction.
+
+Front ends keep only a session id in the browser and look the engine up
+here. Each turn's state (`ChatEngine.to_state`) is written to a local
+SQLite file, so an engine can be dropped from memory at any time: sessions
+idle for `idle_timeout` seconds are evicted by a background thread, and the
+next message for that id rehydrates them from disk. Resident memory then
+tracks active sessions, and sessions survive a process restart. Rows not
+touched for `max_age` seconds are deleted.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Callable, Optional
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+
+
+DEFAULT_STORE_PATH = Path(__file__).parent / "sessions.sqlite3"
+DEFAULT_IDLE_TIMEOUT = 15 * 60
+DEFAULT_MAX_AGE = 30 * 24 * 3600
+
+
+class SessionStore:
+    """Session id -> live object (anything with `to_state` / `load_state`), persisted to SQLite."""
+
+    def __init__(
+        self,
+        path: str | os.PathLike = DEFAULT_STORE_PATH,
+        idle_timeout: float = DEFAULT_IDLE_TIMEOUT,
+        max_age: Optional[float] = DEFAULT_MAX_AGE
+    ):
+        self.path = str(path)
+        self.idle_timeout = idle_timeout
+        self.max_age = max_age
+        self.evictions = 0
+        self.rehydrations = 0
+        self._lock = threading.Lock()
+        self._live = {}  # session id -> [object, last used]
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " id TEXT PRIMARY KEY,"
+            " state TEXT NOT NULL,"
+            " updated REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated)")
+        self._conn.commit()
+
+        self._closed = threading.Event()
+        self._reaper = threading.Thread(target=self._reap, name="session-reaper", daemon=True)
+        self._reaper.start()
+
+    @staticmethod
+    def new_id() -> str:
+        """An unguessable session id."""
+        return secrets.token_urlsafe(16)
+
+    def get(self, session_id: str, factory: Callable[[], object]):
+        """Return the live object for `session_id`.
+
+        Evicted or stored sessions are rebuilt with `factory()` and their saved
+        state loaded into them; unknown ids get a fresh `factory()` object.
+        """
+        with self._lock:
+            entry = self._live.get(session_id)
+            if entry is not None:
+                entry[1] = time.monotonic()
+                return entry[0]
+            row = self._conn.execute("SELECT state FROM sessions WHERE id = ?", (session_id,)).fetchone()
+
+        session = factory()
+        if row is not None:
+            session.load_state(json.loads(row[0]))
+        with self._lock:
+            # Another request may have opened the same session meanwhile
+            entry = self._live.setdefault(session_id, [session, time.monotonic()])
+            if entry[0] is session and row is not None:
+                self.rehydrations += 1
+            return entry[0]
+
+    def save(self, session_id: str, session=None):
+        """Persist the state of `session` (default: the live one) after a turn."""
+        with self._lock:
+            entry = self._live.get(session_id)
+            if session is None:
+                if entry is None:
+                    return
+                session = entry[0]
+            elif entry is None:
+                self._live[session_id] = [session, time.monotonic()]
+            else:
+                entry[1] = time.monotonic()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (id, state, updated) VALUES (?, ?, ?)",
+                (session_id, json.dumps(session.to_state()), time.time())
+            )
+            self._conn.commit()
+
+    def delete(self, session_id: str):
+        """Forget a session (e.g. when the student clears the chat)."""
+        with self._lock:
+            self._live.pop(session_id, None)
+            self._conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            self._conn.commit()
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        """Drop sessions idle for longer than `idle_timeout` from memory; returns how many.
+
+        Their state is already on disk (`save` runs after every turn).
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            idle = [sid for sid, (_, last_used) in self._live.items() if now - last_used > self.idle_timeout]
+            for session_id in idle:
+                del self._live[session_id]
+            self.evictions += len(idle)
+            if self.max_age is not None:
+                self._conn.execute("DELETE FROM sessions WHERE updated < ?", (time.time() - self.max_age,))
+                self._conn.commit()
+        return len(idle)
+
+    def _reap(self):
+        interval = max(1.0, min(60.0, self.idle_timeout / 2))
+        while not self._closed.wait(interval):
+            try:
+                self.evict_idle()
+            except sqlite3.Error as e:
+                print(f"Warning: Session eviction failed: {e}")
+
+    def stats(self) -> dict:
+        """Live and stored session counts plus eviction/rehydration counters."""
+        with self._lock:
+            (stored,) = self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()
+            live = len(self._live)
+        return {
+            'live': live,
+            'stored': stored,
+            'evictions': self.evictions,
+            'rehydrations': self.rehydrations,
+        }
+
+    def close(self):
+        """Save every live session and close the database."""
+        self._closed.set()
+        with self._lock:
+            for session_id, (session, _) in self._live.items():
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO sessions (id, state, updated) VALUES (?, ?, ?)",
+                    (session_id, json.dumps(session.to_state()), time.time())
+                )
+            self._live.clear()
+            self._conn.commit()
+            self._conn.close()
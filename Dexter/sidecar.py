@@ -0,0 +1,106 @@
+"""
+JSON sidecar files kept next to a Chroma directory.
+
+The re-indexing manifest (`textbook_rag`), the BM25 indexes (`bm25`) and the
+chapter partition map (`chroma_db`) live beside `<persist_dir>` as
+`<persist_dir>_<suffix>`. Writes go to a temp file unique to the writer and
+are then renamed into place, so readers (and other processes) never see a
+half-written file, and `FileCache` re-reads a file only when its mtime
+changes.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, Callable, Optional
+import json
+import os
+import tempfile
+import threading
+import time
+
+
+def sidecar_path(persist_dir: str, suffix: str, *parts: str) -> Path:
+    """`<persist_dir>_<suffix>[/<parts>...]`, next to the Chroma directory."""
+    persist_dir = Path(persist_dir)
+    return persist_dir.parent.joinpath(f"{persist_dir.name}_{suffix}", *parts)
+
+
+def read_json(path: Path, default: Any = None) -> Any:
+    """Parsed contents of `path`, or `default` if it does not exist."""
+    try:
+        text = Path(path).read_text(encoding="utf-8")
+    except FileNotFoundError:
+        return default
+    return json.loads(text)
+
+
+def write_json(path: Path, data: Any, **dump_args) -> float:
+    """Atomically replace `path` with `data` as JSON; returns the new mtime."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, **dump_args)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    return path.stat().st_mtime
+
+
+def _mtime(path: Optional[Path]) -> Optional[float]:
+    if path is None:
+        return None
+    try:
+        return path.stat().st_mtime
+    except FileNotFoundError:
+        return None
+
+
+class FileCache:
+    """Values loaded from files, reloaded when a file's mtime changes.
+
+    The mtime is checked at most every `check_interval` seconds per key.
+    Keys without a file (`path=None`, e.g. in-memory databases) keep the
+    value they were given.
+    """
+
+    def __init__(self, check_interval: float = 1.0):
+        self.check_interval = check_interval
+        self._lock = threading.RLock()
+        self._entries = {}  # key -> [value, file mtime, last checked]
+
+    def get(self, key, path: Optional[Path], load: Callable[[Path], Any], missing: Callable[[], Any]):
+        """The value for `key`: cached, `load(path)` if the file changed, or `missing()` without a file."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (path is None or now - entry[2] < self.check_interval):
+                return entry[0]
+            mtime = _mtime(path)
+            if entry is not None and entry[1] == mtime:
+                value = entry[0]
+            elif mtime is not None:
+                value = load(path)
+            else:
+                value = missing()
+            self._entries[key] = [value, mtime, now]
+            return value
+
+    def set(self, key, value, mtime: Optional[float] = None):
+        """Record `value` as current, e.g. right after writing it with `write_json`."""
+        with self._lock:
+            self._entries[key] = [value, mtime, time.monotonic()]
+
+    def clear(self, keep: Optional[Callable[[Any], bool]] = None):
+        """Forget cached values, except for keys where `keep(key)` is true."""
+        with self._lock:
+            if keep is None:
+                self._entries.clear()
+            else:
+                self._entries = {key: entry for key, entry in self._entries.items() if keep(key)}
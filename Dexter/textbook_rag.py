@@ -3,144 +3,590 @@ RAG Database builder for formatted textbook using Chroma.
 Parses the markdown structured textbook and stores sections with metadata.
 """
 
+import argparse
+import glob
+import hashlib
 import re
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import Manager
+from queue import Empty
+from itertools import groupby
 from pathlib import Path
-from typing import List, Dict, Optional
-from chroma_db import add_to_database
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import bm25
+from chroma_db import (
+    bulk_add,
+    collection_embedding_model,
+    delete_from_database,
+    get_embedding_function,
+    get_pool,
+    resolve_persist_dir,
+)
+from hashing import text_hash
+from sidecar import read_json, sidecar_path, write_json
+from tokens import count_tokens
 
+# Passage size for retrieval; subsections longer than this are split
+DEFAULT_PASSAGE_TOKENS = 256
 
-def parse_textbook(file_path: str) -> tuple[List[str], List[str], List[Dict]]:
+
+def stable_id(metadata: Dict, text: str) -> str:
     """
-    Parse the formatted textbook and extract sections with metadata.
+    Derive a document ID from (chapter, section, subsection, content hash).
     
-    Returns:
-        Tuple of (ids, documents, metadatas)
-        - ids: Incrementing paragraph numbers (1, 2, 3, ...)
-        - documents: The text content for each subsection
-        - metadatas: Metadata dicts containing chapter, section, subsection info
+    The ID only changes when that subsection changes, so edits elsewhere in
+    the textbook leave it (and its embedding) untouched.
     """
-    with open(file_path, 'r', encoding='utf-8') as f:
-        content = f.read()
+    content_hash = hashlib.sha256(text.encode('utf-8')).hexdigest()
+    key = '\x1f'.join([metadata['chapter'], metadata['section'], metadata['subsection'], content_hash])
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()[:24]
+
+
+class _TextbookParser:
+    """
+    Line-at-a-time state machine behind `iter_textbook`.
     
-    ids = []
-    documents = []
-    metadatas = []
-    paragraph_counter = 1
+    It mirrors the original split-based parser: sections are separated by a
+    `---` line (as `content.split('\\n---\\n')` would split them), each
+    section is stripped, and `#`/`##`/`###` headers set the chapter, section
+    and subsection. Only the subsection being read is held in memory.
+    """
     
-    # Split by section dividers (---)
-    sections = content.split('\n---\n')
+    def __init__(self):
+        self.chapter = None
+        self.section = None
+        self.subsection_title = None
+        self.subsection_lines = []
+        self.seen_ids = {}
     
-    current_chapter = None
-    current_section = None
+    def feed(self, line: str):
+        """Process one line of the current section, yielding a finished record if any."""
+        if self.subsection_title is not None:
+            if not line.startswith('#'):
+                self.subsection_lines.append(line)
+                return
+            yield from self.end_subsection()
+        
+        if line.startswith('# '):
+            self.chapter = line.replace('# ', '').strip()
+        elif line.startswith('## '):
+            self.section = line.replace('## ', '').strip()
+        elif line.startswith('### '):
+            self.subsection_title = line.replace('### ', '').strip()
+            self.subsection_lines = []
     
-    for section_content in sections:
-        lines = section_content.strip().split('\n')
+    def end_subsection(self):
+        title, lines = self.subsection_title, self.subsection_lines
+        self.subsection_title = None
+        self.subsection_lines = []
+        if title is None:
+            return
+        
+        subsection_text = '\n'.join(lines).strip()
+        if not subsection_text:  # Only add if there's content
+            return
         
-        i = 0
-        while i < len(lines):
-            line = lines[i]
+        metadata = {
+            'chapter': self.chapter or 'Unknown',
+            'section': self.section or 'Unknown',
+            'subsection': title
+        }
+        
+        # Identical subsections get a numeric suffix to stay unique
+        doc_id = stable_id(metadata, subsection_text)
+        self.seen_ids[doc_id] = self.seen_ids.get(doc_id, 0) + 1
+        if self.seen_ids[doc_id] > 1:
+            doc_id = f"{doc_id}-{self.seen_ids[doc_id]}"
+        yield doc_id, subsection_text, metadata
+
+
+def iter_textbook(file_path: str) -> Iterator[Tuple[str, str, Dict]]:
+    """
+    Stream (id, document, metadata) records from the formatted textbook.
+    
+    The file is read line by line, so memory stays constant regardless of
+    textbook size, and the records match `parse_textbook` exactly.
+    """
+    parser = _TextbookParser()
+    # Each section is stripped: hold back its last non-blank line (and the
+    # blank lines after it) until we know whether the section continues.
+    pending = None
+    pending_blanks = []
+    section_started = False
+    previous_was_divider = True  # a '---' on the first line is not a divider
+    
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for raw_line in f:
+            line = raw_line[:-1] if raw_line.endswith('\n') else raw_line
             
-            # Check for chapter header (# CHAPTER)
-            if line.startswith('# '):
-                current_chapter = line.replace('# ', '').strip()
-                i += 1
+            if line == '---' and raw_line.endswith('\n') and not previous_was_divider:
+                previous_was_divider = True
+                if pending is not None:
+                    yield from parser.feed(pending.rstrip())
+                yield from parser.end_subsection()
+                pending = None
+                pending_blanks = []
+                section_started = False
                 continue
+            previous_was_divider = False
             
-            # Check for section header (## SECTION)
-            if line.startswith('## '):
-                current_section = line.replace('## ', '').strip()
-                i += 1
+            if not line.strip():
+                if section_started:
+                    pending_blanks.append(line)
                 continue
             
-            # Check for subsection header (### Subsection)
-            if line.startswith('### '):
-                subsection_title = line.replace('### ', '').strip()
-                
-                # Extract the subsection content (everything until next header or end)
-                subsection_content_lines = []
-                i += 1
-                
-                while i < len(lines):
-                    if lines[i].startswith('###') or lines[i].startswith('##') or lines[i].startswith('#'):
-                        break
-                    subsection_content_lines.append(lines[i])
-                    i += 1
-                
-                subsection_text = '\n'.join(subsection_content_lines).strip()
-                
-                if subsection_text:  # Only add if there's content
-                    # Use incrementing paragraph number as ID
-                    ids.append(str(paragraph_counter))
-                    documents.append(subsection_text)
-                    
-                    # Create metadata
-                    metadata = {
-                        'chapter': current_chapter or 'Unknown',
-                        'section': current_section or 'Unknown',
-                        'subsection': subsection_title
-                    }
-                    metadatas.append(metadata)
-                    
-                    paragraph_counter += 1
-                
+            if pending is not None:
+                yield from parser.feed(pending)
+                for blank in pending_blanks:
+                    yield from parser.feed(blank)
+            pending = line if section_started else line.lstrip()
+            pending_blanks = []
+            section_started = True
+    
+    if pending is not None:
+        yield from parser.feed(pending.rstrip())
+    yield from parser.end_subsection()
+
+
+def _passage_units(text: str, max_tokens: int) -> Iterator[Tuple[str, str]]:
+    """(joiner, unit) pieces of `text`, each within `max_tokens`: paragraphs,
+    else sentences, else runs of words."""
+    for paragraph_number, paragraph in enumerate(re.split(r'\n\s*\n', text)):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        joiner = '\n\n'
+        if count_tokens(paragraph) <= max_tokens:
+            yield joiner, paragraph
+            continue
+        for sentence in re.split(r'(?<=[.!?])\s+', paragraph):
+            if count_tokens(sentence) <= max_tokens:
+                yield joiner, sentence
+                joiner = ' '
                 continue
-            
-            i += 1
+            words = []
+            for word in sentence.split():
+                if words and count_tokens(' '.join(words + [word])) > max_tokens:
+                    yield joiner, ' '.join(words)
+                    joiner = ' '
+                    words = []
+                words.append(word)
+            if words:
+                yield joiner, ' '.join(words)
+                joiner = ' '
+
+
+def chunk_passages(text: str, max_tokens: int = DEFAULT_PASSAGE_TOKENS) -> List[str]:
+    """
+    Split a subsection into passages of at most `max_tokens` tokens.
+    
+    Breaks fall on paragraph boundaries where possible, then sentences, and
+    only split inside a sentence that is longer than a passage on its own.
+    """
+    passages = []
+    current = ''
+    for joiner, unit in _passage_units(text, max_tokens):
+        candidate = f"{current}{joiner}{unit}" if current else unit
+        if current and count_tokens(candidate) > max_tokens:
+            passages.append(current)
+            candidate = unit
+        current = candidate
+    if current:
+        passages.append(current)
+    return passages
+
+
+def iter_passages(
+    records: Iterable[Tuple[str, str, Dict]],
+    max_tokens: Optional[int] = DEFAULT_PASSAGE_TOKENS
+) -> Iterator[Tuple[str, str, Dict]]:
+    """
+    Index stage: turn subsection records into token-bounded passage records.
+    
+    Every record gets its `token_count` in metadata so retrieval can pack
+    context into a budget without re-tokenizing. Subsections that fit keep
+    their ID; longer ones become `<id>-p<n>-<hash>` passages with `parent_id`
+    and `passage` metadata. The hash of the passage text is part of the ID, so
+    chunking the same subsection differently (another `max_tokens`, or token
+    counts estimated instead of taken from tiktoken) yields new IDs and the
+    old passages are removed rather than kept under their positions.
+    `max_tokens=None` (or 0) keeps whole subsections.
+    """
+    for doc_id, text, metadata in records:
+        passages = chunk_passages(text, max_tokens) if max_tokens else [text]
+        if len(passages) == 1:
+            yield doc_id, text, {**metadata, 'token_count': count_tokens(text)}
+            continue
+        for number, passage in enumerate(passages):
+            yield f"{doc_id}-p{number}-{text_hash(passage)[:12]}", passage, {
+                **metadata,
+                'parent_id': doc_id,
+                'passage': number,
+                'token_count': count_tokens(passage),
+            }
+
+
+def parse_textbook(file_path: str) -> tuple[List[str], List[str], List[Dict]]:
+    """
+    Parse the formatted textbook and extract sections with metadata.
+    
+    Collects `iter_textbook` into lists; prefer the generator for large books.
     
+    Returns:
+        Tuple of (ids, documents, metadatas)
+        - ids: Stable content-derived IDs (see `stable_id`)
+        - documents: The text content for each subsection
+        - metadatas: Metadata dicts containing chapter, section, subsection info
+    """
+    ids = []
+    documents = []
+    metadatas = []
+    for doc_id, document, metadata in iter_textbook(file_path):
+        ids.append(doc_id)
+        documents.append(document)
+        metadatas.append(metadata)
     return ids, documents, metadatas
 
+def manifest_path(persist_dir: str) -> Path:
+    """Location of the re-indexing manifest (see `sidecar`)."""
+    return sidecar_path(persist_dir, "manifest.json")
+
+
+def load_manifest(persist_dir: Optional[str]) -> Dict:
+    """
+    Load the manifest of indexed IDs: {collection: {textbook file name: [ids]}}.
+    
+    Returns an empty manifest for in-memory databases or on the first build.
+    """
+    if not persist_dir:
+        return {}
+    return read_json(manifest_path(persist_dir), {})
+
+
+def save_manifest(persist_dir: Optional[str], manifest: Dict):
+    if not persist_dir:
+        return
+    write_json(manifest_path(persist_dir), manifest, indent=2, sort_keys=True)
+
+
+def sync_textbook_records(
+    records: Iterable[Tuple[str, str, Dict]],
+    source: str,
+    collection_name: str,
+    persist_dir: Optional[str] = None,
+    batch_size: int = 100,
+    max_workers: int = 4,
+    embedding_model: Optional[str] = None
+) -> Dict:
+    """
+    Incrementally sync one textbook's records into a collection.
+    
+    Only records whose stable ID is not yet in the collection are embedded,
+    and IDs listed for `source` in the manifest but no longer produced are
+    deleted. Documents are embedded with the collection's recorded model;
+    `embedding_model` picks it for a new collection and must match an existing one.
+    The collection's BM25 index (see `bm25`) is updated alongside.
+    
+    Returns:
+        `bulk_add` statistics plus `documents` (records seen) and `removed`
+    """
+    collection = get_pool().get_collection(collection_name, persist_dir, embedding_model)
+    manifest = load_manifest(persist_dir)
+    
+    if collection_name in manifest:
+        previous = set(manifest[collection_name].get(source, []))
+    else:
+        # First incremental build: replace documents indexed under legacy IDs
+        previous = set(collection.get(include=[])['ids'])
+    
+    ids = []
+    lexical_index = bm25.get_index(resolve_persist_dir(persist_dir), collection)
+    
+    def tracked():
+        for record in records:
+            ids.append(record[0])
+            lexical_index.add(*record)
+            yield record
+    
+    stats = bulk_add(
+        collection,
+        tracked(),
+        get_embedding_function(collection_embedding_model(collection)),
+        batch_size=batch_size,
+        max_workers=max_workers
+    )
+    
+    removed = sorted(previous - set(ids))
+    delete_from_database(collection_name, removed, persist_dir)
+    bm25.save_index(resolve_persist_dir(persist_dir), collection_name, lexical_index)
+    
+    manifest.setdefault(collection_name, {})[source] = ids
+    save_manifest(persist_dir, manifest)
+    
+    stats.update(documents=len(ids), removed=len(removed))
+    return stats
+
+
+def partition_name(collection_name: str, chapter: str) -> str:
+    """Chroma-safe name of the collection holding one chapter of `collection_name`."""
+    slug = re.sub(r'[^a-zA-Z0-9]+', '-', chapter).strip('-').lower()[:48]
+    digest = hashlib.sha256(chapter.encode('utf-8')).hexdigest()[:6]
+    return f"{collection_name}--{slug}-{digest}" if slug else f"{collection_name}--{digest}"
+
+
+def sync_partitioned_records(
+    records: Iterable[Tuple[str, str, Dict]],
+    source: str,
+    collection_name: str,
+    persist_dir: Optional[str] = None,
+    batch_size: int = 100,
+    max_workers: int = 4,
+    embedding_model: Optional[str] = None
+) -> Dict:
+    """
+    Sync one textbook into per-chapter partitions of `collection_name`.
+    
+    Each chapter goes to its own small collection (`partition_name`) through
+    `sync_textbook_records`, and the chapter -> partition map is registered
+    with the pool so `query_textbook` can route chapter-scoped queries
+    without a metadata filter. Records stream chapter by chapter, so a
+    chapter must be contiguous in the book.
+    
+    Returns:
+        Combined statistics over the book's partitions
+    """
+    pool = get_pool()
+    partitions = pool.get_partitions(collection_name, persist_dir)
+    totals = {'added': 0, 'skipped': 0, 'seconds': 0.0, 'documents': 0, 'removed': 0}
+    synced = set()
+    
+    def add(stats):
+        for key in totals:
+            totals[key] += stats[key]
+    
+    for chapter, chapter_records in groupby(records, key=lambda record: record[2]['chapter']):
+        name = partitions.get(chapter) or partition_name(collection_name, chapter)
+        if name in synced:
+            raise ValueError(f"Chapter '{chapter}' appears in more than one place in {source}")
+        add(sync_textbook_records(chapter_records, source, name, persist_dir, batch_size, max_workers, embedding_model))
+        partitions[chapter] = name
+        synced.add(name)
+    
+    # Chapters this book no longer has: drop its passages from their partitions
+    manifest = load_manifest(persist_dir)
+    for name in set(partitions.values()) - synced:
+        if source in manifest.get(name, {}):
+            add(sync_textbook_records([], source, name, persist_dir, batch_size, max_workers, embedding_model))
+    
+    pool.register_partitions(collection_name, partitions, persist_dir)
+    totals['docs_per_sec'] = totals['added'] / totals['seconds'] if totals['seconds'] else 0.0
+    return totals
+
+
 def create_textbook_database(
     textbook_path: str,
     collection_name: str = "textbook-chapters",
-    persist_dir: str = None
-):
+    persist_dir: str = None,
+    batch_size: int = 100,
+    max_workers: int = 4,
+    embedding_model: Optional[str] = None,
+    passage_tokens: Optional[int] = DEFAULT_PASSAGE_TOKENS,
+    partition_by_chapter: bool = False
+) -> Dict:
     """
-    Create a Chroma database from the formatted textbook.
+    Create or incrementally update a Chroma database from the formatted textbook.
+    
+    Records stream from `iter_textbook` through `iter_passages` (chunking long
+    subsections into token-bounded passages) straight into batched ingestion, so
+    memory stays constant for large books. Only passages whose stable ID is
+    not yet in the collection are embedded, and passages that disappeared
+    since the last build (per the manifest next to `persist_dir`) are deleted.
+    Rebuild cost therefore scales with the size of the edit, not the textbook.
     
     Args:
         textbook_path: Path to the formatted textbook file
         collection_name: Name for the Chroma collection
         persist_dir: Directory to persist the database (optional)
+        batch_size: Number of passages per embedding request / write
+        max_workers: Concurrent embedding requests
+        embedding_model: Embedding model for a new collection, e.g.
+            "all-MiniLM-L6-v2" to embed locally (default: OpenAI)
+        passage_tokens: Maximum tokens per passage (None keeps whole subsections)
+        partition_by_chapter: Write one collection per chapter (see
+            `sync_partitioned_records`) so chapter-scoped queries stay fast
+    
+    Returns:
+        `bulk_add` statistics plus `documents` (passages indexed) and
+        `removed` (passages deleted)
     """
-    print(f"Parsing textbook from {textbook_path}...")
-    ids, documents, metadatas = parse_textbook(textbook_path)
-    
-    print(f"Found {len(ids)} subsections")
-    print("\nSubsections found:")
-    for para_id, metadata in zip(ids, metadatas):
-        print(f"  Paragraph {para_id}: {metadata['subsection']}")
-    
-    print(f"\nAdding to Chroma database '{collection_name}'...")
-    add_to_database(
-        collection_name=collection_name,
-        ids=ids,
-        documents=documents,
-        metadatas=metadatas,
-        persist_dir=persist_dir
+    print(f"Parsing {textbook_path} into Chroma database '{collection_name}'...")
+    sync = sync_partitioned_records if partition_by_chapter else sync_textbook_records
+    stats = sync(
+        iter_passages(iter_textbook(textbook_path), passage_tokens),
+        Path(textbook_path).name,
+        collection_name,
+        persist_dir,
+        batch_size=batch_size,
+        max_workers=max_workers,
+        embedding_model=embedding_model
     )
+    print(f"  {stats['added']} new or changed, {stats['removed']} removed, "
+          f"{stats['skipped']} unchanged")
+    print(f"✓ Successfully synced RAG database with {stats['documents']} passages!")
+    return stats
+
+
+def expand_textbook_paths(patterns: List[str]) -> List[Path]:
+    """Resolve directories (all `*.txt` inside) and glob patterns to textbook files."""
+    paths = []
+    for pattern in patterns:
+        if Path(pattern).is_dir():
+            paths.extend(sorted(Path(pattern).glob('*.txt')))
+        else:
+            paths.extend(Path(match) for match in sorted(glob.glob(pattern)))
+    return list(dict.fromkeys(paths))
+
+
+def collection_name_for(textbook_path: Path) -> str:
+    """Per-book collection name derived from the file name (Chroma naming rules)."""
+    name = re.sub(r'[^a-zA-Z0-9._-]+', '-', textbook_path.stem).strip('-._')
+    return name if len(name) >= 3 else f"book-{name}"
+
+
+def _parse_in_worker(textbook_path: str, passage_tokens: Optional[int], queue, chunk_size: int) -> float:
+    """Parse one book, putting its passage records on `queue` in chunks of
+    `chunk_size` followed by a None sentinel. Returns the parse time."""
+    start = time.perf_counter()
+    chunk = []
+    for record in iter_passages(iter_textbook(textbook_path), passage_tokens):
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            queue.put(chunk)
+            chunk = []
+    if chunk:
+        queue.put(chunk)
+    queue.put(None)
+    return time.perf_counter() - start
+
+
+def _iter_worker_records(queue, future: Future) -> Iterator[Tuple[str, str, Dict]]:
+    """Records a `_parse_in_worker` call puts on `queue`, as they arrive."""
+    while True:
+        try:
+            chunk = queue.get(timeout=1.0)
+        except Empty:
+            if future.done():
+                future.result()  # re-raise the worker's error
+                raise RuntimeError("Textbook parser exited before finishing")
+            continue
+        if chunk is None:
+            return
+        yield from chunk
+
+
+def ingest_textbooks(
+    patterns: List[str],
+    collection_name: Optional[str] = None,
+    persist_dir: Optional[str] = None,
+    processes: Optional[int] = None,
+    batch_size: int = 100,
+    max_workers: int = 4,
+    embedding_model: Optional[str] = None,
+    passage_tokens: Optional[int] = DEFAULT_PASSAGE_TOKENS,
+    partition_by_chapter: bool = False,
+    queued_chunks: int = 4
+) -> Dict[str, Dict]:
+    """
+    Parse many formatted textbooks in a process pool and sync them into Chroma.
     
-    print(f"✓ Successfully created RAG database with {len(ids)} documents!")
-    return ids, documents, metadatas
+    Files are parsed (and chunked into passages) in parallel. Each worker
+    streams its records back in chunks of `batch_size` through a queue holding
+    at most `queued_chunks` of them, and the parent feeds them, book by book,
+    through the single embedding/writer pipeline (`sync_textbook_records`), so
+    no whole book is ever held in memory. Records go either into the shared
+    `collection_name` or, if that is None, into one collection per book. With
+    `partition_by_chapter`, each of those is split into per-chapter partitions.
+    
+    Returns:
+        Per-file statistics keyed by file name
+    """
+    paths = expand_textbook_paths(patterns)
+    if not paths:
+        print("No textbook files found.")
+        return {}
+    
+    print(f"Ingesting {len(paths)} textbook(s) into {persist_dir or 'in-memory database'}...")
+    summary = {}
+    with Manager() as manager, ProcessPoolExecutor(max_workers=processes) as executor:
+        # Workers block once their book's queue is full, so at most
+        # processes * queued_chunks * batch_size records are in flight
+        queues = [manager.Queue(maxsize=queued_chunks) for _ in paths]
+        futures = [
+            executor.submit(_parse_in_worker, str(path), passage_tokens, queue, batch_size)
+            for path, queue in zip(paths, queues)
+        ]
+        for done, (path, queue, future) in enumerate(zip(paths, queues, futures), start=1):
+            target = collection_name or collection_name_for(path)
+            sync = sync_partitioned_records if partition_by_chapter else sync_textbook_records
+            stats = sync(
+                _iter_worker_records(queue, future),
+                path.name,
+                target,
+                persist_dir,
+                batch_size=batch_size,
+                max_workers=max_workers,
+                embedding_model=embedding_model
+            )
+            parse_seconds = future.result()
+            stats.update(collection=target, parse_seconds=parse_seconds)
+            summary[path.name] = stats
+            print(f"[{done}/{len(paths)}] {path.name} -> {target}: {stats['documents']} passages, "
+                  f"{stats['added']} added, {stats['removed']} removed, "
+                  f"{stats['docs_per_sec']:.1f} docs/sec")
+    
+    print("\n" + "="*60)
+    print("Summary")
+    print("="*60)
+    for name, stats in summary.items():
+        print(f"  {name}: parsed in {stats['parse_seconds']:.2f}s, "
+              f"embedded {stats['added']} in {stats['seconds']:.2f}s "
+              f"({stats['docs_per_sec']:.1f} docs/sec) -> {stats['collection']}")
+    total_added = sum(stats['added'] for stats in summary.values())
+    total_documents = sum(stats['documents'] for stats in summary.values())
+    print(f"✓ {total_documents} passages from {len(summary)} file(s), {total_added} newly embedded")
+    return summary
 
 
 if __name__ == "__main__":
-    # Set up paths
     dexter_dir = Path(__file__).parent
-    textbook_file = dexter_dir / "chapter_1_textbook_formatted.txt"
-    db_dir = dexter_dir / "chroma_db_persistent"
-    
-    # Create the database
-    ids, documents, metadatas = create_textbook_database(
-        str(textbook_file),
-        collection_name="chapter-1-functions",
-        persist_dir=str(db_dir)
-    )
     
-    # Print example
-    print("\n" + "="*60)
-    print("Example: First subsection")
-    print("="*60)
-    if ids:
-        print(f"ID: {ids[0]}")
-        print(f"Metadata: {metadatas[0]}")
-        print(f"Content preview (first 200 chars):\n{documents[0][:200]}...")
+    parser = argparse.ArgumentParser('TextbookRAG')
+    parser.add_argument('textbooks', nargs='*', default=[str(dexter_dir / "chapter_1_textbook_formatted.txt")],
+                        help='Formatted textbook files, directories or glob patterns')
+    parser.add_argument('--collection', default='chapter-1-functions',
+                        help='Shared collection for all books (ignored with --per-book)')
+    parser.add_argument('--per-book', action='store_true', help='Write each book to its own collection')
+    parser.add_argument('--db-path', default=str(dexter_dir / "chroma_db_persistent"), help='Path to Chroma database')
+    parser.add_argument('--processes', type=int, default=None, help='Parser processes (default: CPU count)')
+    parser.add_argument('--batch-size', type=int, default=100, help='Documents per embedding request')
+    parser.add_argument('--workers', type=int, default=4, help='Concurrent embedding requests')
+    parser.add_argument('--embedding-model', default=None,
+                        help="Embedding model for new collections, e.g. all-MiniLM-L6-v2 to embed locally")
+    parser.add_argument('--passage-tokens', type=int, default=DEFAULT_PASSAGE_TOKENS,
+                        help='Maximum tokens per passage (0 keeps whole subsections)')
+    parser.add_argument('--partition-by-chapter', action='store_true',
+                        help='Write one collection per chapter for fast chapter-scoped queries')
+    args = parser.parse_args()
+    
+    ingest_textbooks(
+        args.textbooks,
+        collection_name=None if args.per_book else args.collection,
+        persist_dir=args.db_path,
+        processes=args.processes,
+        batch_size=args.batch_size,
+        max_workers=args.workers,
+        embedding_model=args.embedding_model,
+        passage_tokens=args.passage_tokens or None,
+        partition_by_chapter=args.partition_by_chapter
+    )
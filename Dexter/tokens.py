@@ -0,0 +1,51 @@
+"""
+Token counting helpers.
+
+Uses `tiktoken` when it is installed (and its encodings can be loaded) and
+falls back to a ~4 characters per token estimate otherwise, which is close
+enough for budgeting.
+"""
+
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:  # optional dependency
+    tiktoken = None
+
+
+@lru_cache(maxsize=None)
+def _encoding(model: str):
+    if tiktoken is None:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        # The BPE files are downloaded on first use; estimate when offline
+        return None
+
+
+def count_tokens(text: str, model: str = "gpt-5-nano") -> int:
+    """Number of tokens `text` takes for `model` (estimated without tiktoken)."""
+    if not text:
+        return 0
+    encoding = _encoding(model)
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str = "gpt-5-nano") -> str:
+    """The longest prefix of `text` that fits in `max_tokens`."""
+    if max_tokens <= 0:
+        return ''
+    encoding = _encoding(model)
+    if encoding is None:
+        return text[:max_tokens * 4]
+    token_ids = encoding.encode(text, disallowed_special=())
+    if len(token_ids) <= max_tokens:
+        return text
+    return encoding.decode(token_ids[:max_tokens])
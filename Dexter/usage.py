@@ -1,5 +1,6 @@
 # Pricing per 1M tokens (USD) for recent OpenAI models, fetched December 29, 2025.
 import sys
+from array import array
 
 PRICING = {
     'gpt-5.2': {'input': 1.75, 'cached': 0.175, 'output': 14.00},
@@ -21,28 +22,108 @@ def _calculate_cost_usd(model, usage) -> float:
     rates = PRICING.get(model)
     if not rates:
         return 0.0
-    input_cost = usage['input'] * rates['input']
+    # `input` includes the cached tokens, which are billed at the cached rate instead
+    input_cost = (usage['input'] - usage['cached']) * rates['input']
     cached_cost = usage['cached'] * rates.get('cached', rates['input'])
     output_cost = usage['output'] * rates['output']
     # Prices are per 1M tokens.
     return (input_cost + cached_cost + output_cost) / 1_000_000
 
 
+USAGE_FIELDS = ('input', 'cached', 'output', 'reasoning')
+
+
+def _usage_row(usage) -> tuple:
+    input_details = getattr(usage, 'input_tokens_details', None)
+    output_details = getattr(usage, 'output_tokens_details', None)
+    return (
+        usage.input_tokens,
+        getattr(input_details, 'cached_tokens', 0) or 0,
+        usage.output_tokens,
+        getattr(output_details, 'reasoning_tokens', 0) or 0,
+    )
+
+
 def _aggregate_usage(usages):
-    total = {'input': 0, 'cached': 0, 'output': 0, 'reasoning': 0}
+    if isinstance(usages, UsageTracker):
+        return usages.total
+    total = dict.fromkeys(USAGE_FIELDS, 0)
     for usage in usages:
-        total['input'] += usage.input_tokens
-        total['cached'] += usage.input_tokens_details.cached_tokens
-        total['output'] += usage.output_tokens
-        total['reasoning'] += usage.output_tokens_details.reasoning_tokens
+        for key, value in zip(USAGE_FIELDS, _usage_row(usage)):
+            total[key] += value
     return total
 
 
+class UsageTracker:
+    """Running usage totals for one session.
+
+    `add` is O(1): it appends one row to array-backed per-turn columns and
+    bumps the running totals, so the cumulative view never re-scans the
+    session. `rollup` aggregates many trackers for per-class reports.
+    """
+
+    def __init__(self, model: str):
+        self.model = model
+        self.columns = {key: array('q') for key in USAGE_FIELDS}
+        self._total = dict.fromkeys(USAGE_FIELDS, 0)
+
+    def add(self, usage):
+        """Record the usage object of one response."""
+        for key, value in zip(USAGE_FIELDS, _usage_row(usage)):
+            self.columns[key].append(value)
+            self._total[key] += value
+
+    def __len__(self):
+        return len(self.columns['input'])
+
+    @property
+    def total(self) -> dict:
+        """Cumulative tokens for the session."""
+        return dict(self._total)
+
+    def turn(self, index: int = -1) -> dict:
+        """Tokens for one turn (default: the latest)."""
+        if not len(self):
+            return dict.fromkeys(USAGE_FIELDS, 0)
+        return {key: self.columns[key][index] for key in USAGE_FIELDS}
+
+    def cost(self) -> float:
+        return _calculate_cost_usd(self.model, self._total)
+
+    def turn_cost(self, index: int = -1) -> float:
+        return _calculate_cost_usd(self.model, self.turn(index))
+
+    def to_state(self) -> dict:
+        """Per-turn columns as lists (see `load_state`)."""
+        return {key: column.tolist() for key, column in self.columns.items()}
+
+    def load_state(self, state: dict):
+        self.columns = {key: array('q', state.get(key, ())) for key in USAGE_FIELDS}
+        self._total = {key: sum(column) for key, column in self.columns.items()}
+
+    @staticmethod
+    def rollup(trackers) -> dict:
+        """Aggregate many sessions into per-model totals, costs and counts."""
+        report = {}
+        for tracker in trackers:
+            row = report.get(tracker.model)
+            if row is None:
+                row = report[tracker.model] = dict.fromkeys(USAGE_FIELDS, 0)
+                row.update(sessions=0, turns=0)
+            for key in USAGE_FIELDS:
+                row[key] += tracker._total[key]
+            row['sessions'] += 1
+            row['turns'] += len(tracker)
+        for model, row in report.items():
+            row['cost'] = _calculate_cost_usd(model, row)
+        return report
+
+
 def print_usage(model, usage, file=sys.stderr):
     print(' Usage '.center(30, '-'), file=file)
     print('Model:', model, file=file)
 
-    if not isinstance(usage, list):
+    if not isinstance(usage, (list, UsageTracker)):
         usage = [usage]
     total = _aggregate_usage(usage)
 
@@ -56,11 +137,13 @@ def print_usage(model, usage, file=sys.stderr):
         print('Total cost: n/a (pricing unavailable for model)', file=file)
 
 
-def format_usage_markdown(model, usage) -> str:
-    if not isinstance(usage, list):
+def format_usage_markdown(model, usage, history_stats=None) -> str:
+    """Usage panel markdown for a list of usage objects or a `UsageTracker`."""
+    if not isinstance(usage, (list, UsageTracker)):
         usage = [usage]
     total_usage = _aggregate_usage(usage)
     cost = _calculate_cost_usd(model, total_usage)
+    cached_ratio = total_usage['cached'] / total_usage['input'] if total_usage['input'] else 0.0
     token_table = '\n'.join(
         f"| {key.title()} | {value} |"
         for key, value in total_usage.items()
@@ -72,7 +155,22 @@ def format_usage_markdown(model, usage) -> str:
         "|    | Tokens |\n"
         "|----|--------|\n"
         + token_table +
-        f"\n\n**Total cost**: ${cost:.6f}\n"
+        f"\n\n**Cached input**: {cached_ratio:.1%}\n"
+        f"\n**Total cost**: ${cost:.6f}\n"
     )
-    print(out)
+    if history_stats:
+        out += (
+            "\n## History\n\n"
+            f"**Last request**: {history_stats['last_input_tokens']} tokens "
+            f"(budget {history_stats['token_budget']})\n\n"
+            f"**Trimmed**: {history_stats['last_saved_tokens']} tokens last turn, "
+            f"{history_stats['total_saved_tokens']} this session\n"
+        )
+    if isinstance(usage, UsageTracker) and len(usage):
+        last = usage.turn()
+        out += (
+            "\n## Last turn\n\n"
+            f"**Tokens**: {last['input']} in ({last['cached']} cached), {last['output']} out\n\n"
+            f"**Cost**: ${usage.turn_cost():.6f}\n"
+        )
     return out
@@ -0,0 +1,177 @@
+import json
+import os
+import sys
+import threading
+import weakref
+from pathlib import Path
+
+import streamlit as st
+import streamlit.components.v1 as components
+from openai import OpenAI
+
+# The chat engine lives in Dexter/ next to the textbook database
+DEXTER_DIR = Path(__file__).parent.parent / "Dexter"
+if str(DEXTER_DIR) not in sys.path:
+    sys.path.insert(0, str(DEXTER_DIR))
+
+from chat_engine import PERSONAS, ChatEngine, load_prompt  # noqa: E402
+from mathjax import mathjax_component  # noqa: E402
+from metrics import enable_json_logs, start_metrics_server  # noqa: E402
+from openai_clients import get_client  # noqa: E402
+from session_store import DEFAULT_IDLE_TIMEOUT, DEFAULT_STORE_PATH, SessionStore  # noqa: E402
+
+
+@st.cache_resource
+def get_openai_client(api_key: str) -> OpenAI:
+    # One client (and connection pool) per API key, shared across reruns and users
+    return get_client(api_key)
+
+
+@st.cache_resource
+def get_session_store() -> SessionStore:
+    # Conversations for every user of this server; idle ones are paged out to SQLite
+    return SessionStore(
+        os.getenv("SESSION_DB", str(DEFAULT_STORE_PATH)),
+        float(os.getenv("SESSION_IDLE_TIMEOUT", DEFAULT_IDLE_TIMEOUT))
+    )
+
+
+SESSION_COOKIE = "mathbot_session"
+SESSION_COOKIE_MAX_AGE = 30 * 24 * 3600
+
+
+def get_session_id() -> str:
+    # st.session_state survives page switches; the id is also kept in a browser cookie
+    # (never the URL, where it would let anyone with the link into the conversation) so a
+    # reload or a server restart resumes the conversations
+    session_id = st.session_state.get("session_id") or st.context.cookies.get(SESSION_COOKIE)
+    if not session_id:
+        session_id = SessionStore.new_id()
+    st.session_state["session_id"] = session_id
+    if st.context.cookies.get(SESSION_COOKIE) != session_id and not st.session_state.get("session_cookie_set"):
+        cookie = f"{SESSION_COOKIE}={session_id}; path=/; max-age={SESSION_COOKIE_MAX_AGE}; SameSite=Strict"
+        components.html(f"<script>window.parent.document.cookie = {json.dumps(cookie)};</script>", height=0)
+        st.session_state["session_cookie_set"] = True
+    return session_id
+
+
+_turn_locks_guard = threading.Lock()
+
+
+@st.cache_resource
+def get_turn_locks() -> weakref.WeakValueDictionary:
+    # Store key -> lock; tabs sharing the session cookie share one live engine
+    return weakref.WeakValueDictionary()
+
+
+def turn_lock(store_key: str) -> threading.Lock:
+    """Lock serializing turns on one stored engine across browser tabs."""
+    with _turn_locks_guard:
+        return get_turn_locks().setdefault(store_key, threading.Lock())
+
+
+@st.cache_resource
+def start_metrics():
+    # Once per server process: METRICS_PORT serves /metrics, METRICS_JSON_LOGS logs each response
+    if os.getenv("METRICS_PORT"):
+        start_metrics_server(int(os.getenv("METRICS_PORT")))
+    if os.getenv("METRICS_JSON_LOGS"):
+        enable_json_logs()
+    return True
+
+
+def render_chat_page(persona: str, title: str, placeholder: str):
+    """Render a chat page backed by the shared `ChatEngine` for `persona`."""
+    session_key = PERSONAS[persona]["session_key"]
+    start_metrics()
+
+    # Add back button at the top
+    if st.button("← Back to Home", key=f"back_{persona}"):
+        st.switch_page("streamlit_app.py")
+
+    st.title(title)
+
+    # Custom CSS for user icon color
+    st.markdown("""
+        <style>
+        /* Change user chat icon color */
+        [data-testid="stChatMessageAvatarUser"] {
+            background-color: #35e8d3 !important;
+        }
+        /* Change bot/assistant chat icon color - even lighter */
+        [data-testid="stChatMessageAvatarAssistant"] {
+            background-color: #8ff2e3 !important;
+        }
+        /* Style back button - lighter than background */
+        div.stButton > button {
+            background-color: #26b8bd !important;
+            border-color: #26b8bd !important;
+        }
+        /* Hover effect - grayer version */
+        div.stButton > button:hover {
+            background-color: #4a9fa4 !important;
+            border-color: #4a9fa4 !important;
+        }
+        </style>
+        """, unsafe_allow_html=True)
+
+    # Add MathJax for LaTeX rendering: loaded once per tab, typesets only changed messages.
+    # MATHJAX_FALLBACK_URL can point at a local copy (e.g. app/static/mathjax/tex-svg.js
+    # with server.enableStaticServing) for when the CDN is unreachable.
+    components.html(mathjax_component(os.getenv("MATHJAX_FALLBACK_URL")), height=0)
+
+    # Get API key from session state (user input) only, or fall back to environment/secrets for local dev
+    api_key = st.session_state.get("user_api_key", None)
+    if not api_key:
+        # Try environment/secrets as fallback (for local development)
+        api_key = os.getenv("OPENAI_API_KEY") or st.secrets.get(
+            "OPENAI_API_KEY", None)
+
+    if not api_key:
+        st.error(
+            "⚠️ Missing OpenAI API key. Please go back to the home page and enter your API key.")
+        if st.button("← Back to Home", key=f"back_{persona}_no_key"):
+            st.switch_page("streamlit_app.py")
+        st.stop()
+
+    client = get_openai_client(api_key)
+
+    # One engine (history, retrieval, usage) per browser session and page, held by the
+    # session store rather than st.session_state so idle ones can leave memory
+    def new_engine():
+        try:
+            system_prompt = load_prompt(DEXTER_DIR / PERSONAS[persona]["prompt_file"])
+        except Exception as e:
+            system_prompt = ""
+            st.warning(f"Could not load system prompt: {e}")
+        return ChatEngine.from_persona(persona, prompt=system_prompt, client=client)
+
+    store = get_session_store()
+    store_key = f"{get_session_id()}/{session_key}"
+    engine = store.get(store_key, new_engine)
+    engine.client = client
+
+    # Display chat messages from history on app rerun
+    # Note: st.markdown() supports LaTeX! Use $...$ for inline math and $$...$$ for block math
+    for message in engine.transcript():
+        with st.chat_message(message["role"]):
+            st.markdown(message["content"])
+
+    # React to user input
+    if prompt := st.chat_input(placeholder):
+        # Display user message
+        with st.chat_message("user"):
+            st.markdown(prompt)
+
+        # Retrieve textbook context and stream the response as it arrives; another tab's
+        # turn on the same engine finishes first, or its answer would land on this question
+        with turn_lock(store_key), st.chat_message("assistant"):
+            try:
+                st.write_stream(
+                    text
+                    for kind, text in engine.stream_response(prompt)
+                    if kind == "output"
+                )
+            except Exception as e:
+                st.markdown(f"Error contacting OpenAI: {e}")
+            store.save(store_key, engine)